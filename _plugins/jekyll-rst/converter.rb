@@ -1,6 +1,8 @@
 require 'rbst'
 require 'tempfile'
 require 'open3'
+require 'json'
+require 'digest'
 
 module Jekyll
   class RestConverter < Converter
@@ -49,6 +51,16 @@ module Jekyll
         end
       end
 
+      # Prefer a fragment prerendered by `make rst-prerender`, then the
+      # long-running rst2html worker, then one process per document
+      if doc_path
+        html = prerendered_fragment(content, doc_path)
+        return html unless html.nil?
+
+        html = convert_with_worker(content, doc_path, line_offset)
+        return html unless html.nil?
+      end
+
       # Pass source path if available (requires writing to temp file)
       if doc_path
         # Write content to temp file so we can pass the source path for better error messages
@@ -90,6 +102,96 @@ module Jekyll
 
     private
 
+    # Fragments written by `rst2html.py --batch-output` into the directory named
+    # by JEKYLL_RST_PRERENDERED; used only while the manifest's source hash
+    # still matches the content Jekyll hands us.
+    def prerendered_fragment(content, doc_path)
+      dir = ENV['JEKYLL_RST_PRERENDERED']
+      return nil if dir.nil? || dir.empty?
+
+      @prerendered ||= begin
+        JSON.parse(File.read(File.join(dir, 'manifest.json')))['documents'] || {}
+      rescue StandardError
+        {}
+      end
+
+      entry = @prerendered[doc_path]
+      return nil unless entry && entry['error'].nil?
+      return nil unless entry['source_sha256'] == Digest::SHA256.hexdigest(content)
+
+      diagnostics = File.read(File.join(dir, entry['diagnostics']), :encoding => 'UTF-8')
+      $stderr.puts diagnostics unless diagnostics.empty?
+      File.read(File.join(dir, entry['output']), :encoding => 'UTF-8')
+    rescue StandardError
+      nil
+    end
+
+    # Set JEKYLL_RST_WORKER=0 to spawn python3 once per document instead
+    def worker_enabled?
+      ENV['JEKYLL_RST_WORKER'] != '0' && !@worker_disabled
+    end
+
+    # Render through a single `rst2html.py --worker` process kept alive for the
+    # whole build, so docutils/pygments are imported once rather than per post.
+    # Returns nil when the worker is unavailable or fails on this document.
+    def convert_with_worker(content, doc_path, line_offset)
+      return nil unless worker_enabled?
+
+      worker = rst_worker
+      request = {
+        'source' => content,
+        'source_path' => doc_path,
+        'line_offset' => line_offset,
+        'part' => 'fragment',
+        'settings' => { 'initial_header_level' => '2' }
+      }
+      worker[:stdin].puts(JSON.generate(request, ascii_only: true))
+      worker[:stdin].flush
+
+      line = worker[:stdout].gets
+      raise IOError, "worker exited (#{worker[:thread].value})" if line.nil?
+      response = JSON.parse(line)
+
+      diagnostics = response['diagnostics']
+      $stderr.puts diagnostics if diagnostics && !diagnostics.empty?
+
+      if response['error']
+        # Document-level failure: let the one-shot path report it as before
+        Jekyll.logger.warn "RST worker:", "#{doc_path}: #{response['error']}"
+        return nil
+      end
+
+      # Match the trailing newline printed by the one-shot rst2html.py
+      response['html'] + "\n"
+    rescue StandardError => e
+      Jekyll.logger.warn "RST worker:", "#{e.message}; falling back to one process per document"
+      stop_rst_worker
+      @worker_disabled = true
+      nil
+    end
+
+    def rst_worker
+      return @rst_worker if @rst_worker
+
+      stdin, stdout, thread = Open3.popen2("python3", RbST.executables[:html], "--worker")
+      stdout.set_encoding(Encoding::UTF_8)
+      @rst_worker = { :stdin => stdin, :stdout => stdout, :thread => thread }
+      at_exit { stop_rst_worker }
+      @rst_worker
+    end
+
+    def stop_rst_worker
+      return unless @rst_worker
+
+      worker = @rst_worker
+      @rst_worker = nil
+      worker[:stdin].close unless worker[:stdin].closed?
+      worker[:thread].join(5)
+      worker[:stdout].close unless worker[:stdout].closed?
+    rescue StandardError
+      nil
+    end
+
     def adjust_line_numbers(stderr_text, offset)
       return stderr_text if offset == 0
 
@@ -10,16 +10,13 @@
 
 import re
 import os
-import hashlib
-import __main__
+import time
+import contextlib
 
-# Absolute path to pygments cache dir
-PYGMENTS_CACHE_DIR = os.path.abspath(os.path.join(os.path.dirname(__main__.__file__), '../../.pygments-cache'))
-
-# Ensure cache dir exists
-if not os.path.exists(PYGMENTS_CACHE_DIR):
-    os.makedirs(PYGMENTS_CACHE_DIR)
+import render_timings
+from render_cache import DiskCache
 
+import pygments
 from pygments.formatters import HtmlFormatter
 
 from docutils import nodes
@@ -29,6 +26,275 @@ from docutils.parsers.rst.directives.tables import ListTable as DocutilsListTabl
 from pygments import highlight
 from pygments.lexers import get_lexer_by_name, TextLexer
 
+# Highlighted code blocks keyed by pygments version, lexer, formatter options
+# and source. JEKYLL_RST_PYGMENTS_CACHE_DIR moves it; JEKYLL_RST_PYGMENTS_CACHE_MAX_MB
+# bounds it (0 disables caching).
+highlight_cache = DiskCache(
+    os.environ.get('JEKYLL_RST_PYGMENTS_CACHE_DIR')
+    or os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../.pygments-cache'),
+    int(float(os.environ.get('JEKYLL_RST_PYGMENTS_CACHE_MAX_MB', '64')) * 1024 * 1024),
+    suffix='.html',
+)
+
+# Languages most used by our posts' code blocks, loaded up front by
+# long-lived renderers (see `prewarm`)
+PREWARM_LEXERS = ('bash', 'python', 'yaml', 'text', 'javascript', 'sql', 'json', 'shell', 'html', 'dockerfile')
+
+# Lexer and formatter instances, reused for the life of the process
+_lexers = {}
+_formatters = {}
+
+# Parallel highlighting (see `deferred_highlighting`). JEKYLL_RST_HIGHLIGHT_JOBS
+# is the number of worker processes (default: CPU count; 1 highlights inline);
+# a document's uncached code must reach JEKYLL_RST_HIGHLIGHT_MIN_CHARS before
+# it is worth sending to the pool.
+highlight_jobs = int(os.environ.get('JEKYLL_RST_HIGHLIGHT_JOBS') or os.cpu_count() or 1)
+highlight_min_chars = int(os.environ.get('JEKYLL_RST_HIGHLIGHT_MIN_CHARS', '65536'))
+
+# Deferred blocks of the document being rendered, and the shared pool
+_deferred = None
+_pool = None
+
+# Directives handled by `Pygments` (registered at the end of this module)
+_CODE_DIRECTIVE = re.compile(r'^[ \t]*\.\.[ \t]+(?:code-block|sourcecode)::', re.MULTILINE)
+
+# First words that mark a code block as a Mermaid diagram
+MERMAID_KEYWORDS = frozenset(['mindmap', 'graph', 'flowchart', 'sequenceDiagram', 'classDiagram',
+                              'stateDiagram', 'erDiagram', 'gantt', 'pie', 'journey', 'gitGraph'])
+
+
+def _clean_mermaid(lines):
+    """Join diagram lines, blanking whitespace-only lines and trimming the ends."""
+    # Preserve empty lines - mermaid syntax may need them
+    cleaned_lines = [line.rstrip() if line.strip() else '' for line in lines]
+    # Join with newlines - preserve structure including blank lines
+    return '\n'.join(cleaned_lines).strip()
+
+
+def _is_mermaid(source):
+    first_word = source.split()[0] if source else ''
+    return first_word in MERMAID_KEYWORDS
+
+
+def _mermaid_source(highlighted_lines):
+    """
+    Recover the plain text of a highlighted block and return it if it looks like
+    a Mermaid diagram (starts with a Mermaid keyword), else None.
+
+    Each line keeps the text up to its first closing span, so only blocks
+    highlighted without token markup produce usable source. Stops at the
+    first non-blank line unless it starts with a Mermaid keyword, so long
+    listings are not copied for nothing.
+    """
+    lines = []
+    for line in highlighted_lines:
+        if line.startswith('<span></span>'):
+            line = line[len('<span></span>'):]
+        end = line.find('</span>')
+        if end != -1:
+            line = line[:end]
+        # Still escaped: Pygments only escapes characters no keyword contains
+        if not lines and not _is_mermaid(line.strip()):
+            if line.strip():
+                return None
+            continue
+        lines.append(line)
+    if not lines:
+        return None
+    import html
+    # Unescape HTML entities (&amp; -> &, &lt; -> <, etc.)
+    source = _clean_mermaid([html.unescape(line) for line in lines])
+    return source if _is_mermaid(source) else None
+
+
+def get_lexer(name, **options):
+    """
+    Return ``(lexer_name, lexer)`` for a code block language, creating the
+    lexer once per (name, options). Unknown names fall back to a `TextLexer`
+    named 'text'; the miss is remembered too, since Pygments scans every
+    installed plugin before giving up on a name.
+    """
+    key = (name, tuple(sorted(options.items())))
+    entry = _lexers.get(key)
+    if entry is None:
+        try:
+            entry = (name, get_lexer_by_name(name, **options))
+        except ValueError:
+            # no lexer found - use the text one instead of an exception
+            entry = ('text', TextLexer(**options))
+        _lexers[key] = entry
+    return entry
+
+
+def get_formatter(**options):
+    """Shared `HtmlFormatter` for `options`; building one compiles its style tables."""
+    key = tuple(sorted(options.items()))
+    formatter = _formatters.get(key)
+    if formatter is None:
+        formatter = _formatters[key] = HtmlFormatter(**options)
+    return formatter
+
+
+def prewarm(names=PREWARM_LEXERS):
+    """Load the lexers for `names` and the code block formatter ahead of the first document."""
+    for name in names:
+        get_lexer(name)
+    get_formatter(nowrap=True)
+
+
+def _highlight_key(source, lexer_name, lexer, formatter):
+    """Cache key covering everything that changes `highlight()` output."""
+    return DiskCache.digest(
+        f'pygments {pygments.__version__}',
+        lexer_name,
+        f'{type(lexer).__module__}.{type(lexer).__name__}',
+        repr(sorted(lexer.options.items())),
+        f'{type(formatter).__module__}.{type(formatter).__name__}',
+        repr(sorted(formatter.options.items())),
+        source,
+    )
+
+
+def _code_table(lexer_name, highlighted_lines):
+    """
+    Two-column table of line numbers and highlighted lines. Built from a list
+    with a single join, so the cost stays linear in the size of the block.
+    """
+    parts = ['<div class="highlight"><table><tr><td class="gutter"><pre class="line-numbers">']
+    parts.extend('<span class="line-number">%d</span>\n' % n for n in range(1, len(highlighted_lines) + 1))
+    parts.append('</pre></td><td class="code"><pre><code class="%s">' % lexer_name)
+    parts.extend('<span class="line">%s</span>' % line for line in highlighted_lines)
+    parts.append('</code></pre></td></tr></table></div>')
+    return ''.join(parts)
+
+
+def _code_block(lexer_name, parsed, data_attrs, options):
+    """Final markup for a code block from its highlighted (``nowrap``) output."""
+    # The empty span Pygments puts at the start of its <pre> keeps leading
+    # blank lines from being dropped by HTML parsers
+    highlighted_lines = ('<span></span>' + parsed).splitlines(True)
+
+    # Other lexers can still leave a Mermaid keyword as plain text
+    mermaid_source = _mermaid_source(highlighted_lines)
+    if mermaid_source is not None:
+        return _mermaid_markup(mermaid_source, data_attrs)
+
+    # Add wrapper with optional caption and link
+    code = f'<figure class="code"{data_attrs}>'
+    if options:
+        caption = ('<span>%s</span>' % options['caption']) if 'caption' in options else ''
+        title = options['title'] if 'title' in options else 'link'
+        link = ('<a href="%s">%s</a>' % (options['url'], title)) if 'url' in options else ''
+
+        if caption or link:
+            code += '<figcaption>%s %s</figcaption>' % (caption, link)
+    code += '%s</figure>' % _code_table(lexer_name, highlighted_lines)
+    return code
+
+
+def _highlight_job(job):
+    """Highlight one deferred block; runs in a pool worker."""
+    source, lexer_name, lexer_options, formatter_options = job
+    started = time.perf_counter()
+    parsed = highlight(source, get_lexer(lexer_name, **lexer_options)[1], get_formatter(**formatter_options))
+    return parsed, time.perf_counter() - started
+
+
+class DeferredHighlights:
+    """ Uncached code blocks of one document, highlighted together.
+
+    The directive emits a placeholder comment for each block; `resolve`
+    highlights them all (in the pool when there is enough code), stores the
+    results in `highlight_cache` and splices the final markup into the HTML.
+    """
+
+    def __init__(self):
+        # Unique per document, so author text can never match a placeholder
+        self.marker = f'<!-- highlight {os.urandom(16).hex()} '
+        self.blocks = []
+
+    def add(self, source, lexer_name, lexer, formatter, cache_key, data_attrs, options) -> str:
+        job = (source, lexer_name, dict(lexer.options), dict(formatter.options))
+        self.blocks.append((job, cache_key, lexer_name, data_attrs, dict(options)))
+        return f'{self.marker}{len(self.blocks) - 1} -->'
+
+    def _highlight_all(self) -> list:
+        jobs = [block[0] for block in self.blocks]
+        if (highlight_jobs > 1 and len(jobs) > 1
+                and sum(len(job[0]) for job in jobs) >= highlight_min_chars):
+            try:
+                return list(_get_pool().map(_highlight_job, jobs))
+            except Exception:
+                # A broken pool must not fail the build; highlight inline
+                pass
+        return [_highlight_job(job) for job in jobs]
+
+    def resolve(self, html_text: str) -> str:
+        if not self.blocks:
+            return html_text
+        rendered = []
+        for block, (parsed, seconds) in zip(self.blocks, self._highlight_all()):
+            _, cache_key, lexer_name, data_attrs, options = block
+            highlight_cache.put(cache_key, parsed)
+            render_timings.record_highlight(seconds, False)
+            rendered.append(_code_block(lexer_name, parsed, data_attrs, options))
+        placeholder = re.compile(re.escape(self.marker) + r'(\d+) -->')
+        return placeholder.sub(lambda m: rendered[int(m.group(1))], html_text)
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        import atexit
+        from concurrent.futures import ProcessPoolExecutor
+        _pool = ProcessPoolExecutor(max_workers=highlight_jobs)
+        # Shut down before interpreter teardown, or the pool's callbacks
+        # print tracebacks to stderr (which the converter reports)
+        atexit.register(_pool.shutdown)
+    return _pool
+
+
+def _may_use_pool(source) -> bool:
+    """
+    Whether `source` could reach the pool threshold in `_highlight_all`: at
+    least two code blocks and `highlight_min_chars` of text, an upper bound
+    on its uncached code.
+    """
+    if len(source) < highlight_min_chars:
+        return False
+    blocks = _CODE_DIRECTIVE.finditer(source)
+    return next(blocks, None) is not None and next(blocks, None) is not None
+
+
+@contextlib.contextmanager
+def deferred_highlighting(source):
+    """
+    Defer highlighting of uncached code blocks while the document `source`
+    is parsed. Yields a `DeferredHighlights` whose `resolve()` must be
+    applied to the rendered HTML, or None when the blocks are highlighted
+    inline: parallel highlighting is off, or the document has too little
+    code to ever be sent to the pool.
+    """
+    global _deferred
+    if highlight_jobs <= 1 or not _may_use_pool(source):
+        yield None
+        return
+    _deferred = DeferredHighlights()
+    try:
+        yield _deferred
+    finally:
+        _deferred = None
+
+
+def _mermaid_markup(source, data_attrs):
+    # The Chirpy theme's JavaScript looks for pre.language-mermaid. Wrap it in a
+    # div to isolate it from surrounding content, and repeat the data attributes
+    # on the pre in case Mermaid removes the wrapper.
+    return (f'<div class="mermaid-wrapper"{data_attrs}>\n'
+            f'<pre class="language-mermaid"{data_attrs}><code>{source}</code></pre>\n'
+            f'</div>\n')
+
+
 class Pygments(Directive):
     """ Source code syntax hightlighting.
     """
@@ -39,44 +305,9 @@ class Pygments(Directive):
     option_spec = dict([(key, directives.unchanged) for key in string_opts])
     has_content = True
 
-    def run(self):
-        self.assert_has_content()
-        try:
-            lexer_name = self.arguments[0]
-            lexer = get_lexer_by_name(lexer_name)
-        except ValueError:
-            # no lexer found - use the text one instead of an exception
-            lexer_name = 'text'
-            lexer = TextLexer()
-        formatter = HtmlFormatter()
-
-        # Construct cache filename
-        cache_file = None
-        content_text = u'\n'.join(self.content)
-        cache_file_name = '%s-%s.html' % (lexer_name, hashlib.md5(content_text.encode('utf-8')).hexdigest())
-        cached_path = os.path.join(PYGMENTS_CACHE_DIR, cache_file_name)
-
-        # Look for cached version, otherwise parse
-        if os.path.exists(cached_path):
-            cache_file = open(cached_path, 'r')
-            parsed = cache_file.read()
-        else:
-            parsed = highlight(content_text, lexer, formatter)
-
-        # Strip pre tag and everything outside it
-        pres = re.compile(r"<pre>(.+)</pre>", re.S)
-        stripped = pres.search(parsed).group(1)
-
-        # Create tabular code with line numbers
-        table = '<div class="highlight"><table><tr><td class="gutter"><pre class="line-numbers">'
-        lined = ''
-        for idx, line in enumerate(stripped.splitlines(True)):
-            table += '<span class="line-number">%d</span>\n' % (idx + 1)
-            lined  += '<span class="line">%s</span>' % line
-        table += '</pre></td><td class="code"><pre><code class="%s">%s</code></pre></td></tr></table></div>' % (lexer_name, lined)
-
-        # Add wrapper with optional caption and link
-        # Build data attributes for Mermaid sizing options
+    def mermaid_data_attrs(self):
+        """ Build data attributes for Mermaid sizing options.
+        """
         data_attrs = ''
         if self.options:
             # Handle Mermaid-specific sizing options
@@ -106,22 +337,46 @@ class Pygments(Directive):
                 if re.match(r'^[0-9]+(\.[0-9]+)?$', scale_val):
                     data_attrs += f' data-mermaid-scale="{scale_val}"'
 
-        code = f'<figure class="code"{data_attrs}>'
-        if self.options:
-            caption = ('<span>%s</span>' % self.options['caption']) if 'caption' in self.options else ''
-            title = self.options['title'] if 'title' in self.options else 'link'
-            link = ('<a href="%s">%s</a>' % (self.options['url'], title)) if 'url' in self.options else ''
+        return data_attrs
+
+    def run(self):
+        self.assert_has_content()
+        data_attrs = self.mermaid_data_attrs()
+        content_text = u'\n'.join(self.content)
+
+        # Mermaid fast path: diagrams need no highlighting, line-number table or
+        # cache I/O. `mermaid` blocks always take it; plain-text blocks do when
+        # they start with a Mermaid keyword (exactly what the highlighted text
+        # would have shown).
+        if self.arguments[0] == 'mermaid':
+            return [nodes.raw('', _mermaid_markup(_clean_mermaid(content_text.splitlines()), data_attrs), format='html')]
+
+        lexer_name, lexer = get_lexer(self.arguments[0])
 
-            if caption or link:
-                code += '<figcaption>%s %s</figcaption>' % (caption, link)
-        code += '%s</figure>' % table
+        if type(lexer) is TextLexer:
+            source = _clean_mermaid(content_text.splitlines())
+            if _is_mermaid(source):
+                return [nodes.raw('', _mermaid_markup(source, data_attrs), format='html')]
 
-        # Write cache
-        if cache_file is None:
-            cache_file = open(cached_path, 'w')
-            cache_file.write(parsed)
-        cache_file.close()
+        # Only the highlighted lines: no <div>/<pre> wrapper to strip afterwards
+        formatter = get_formatter(nowrap=True)
+
+        # Look for cached version, otherwise parse (or leave it to the
+        # document's deferred batch)
+        started = time.perf_counter()
+        cache_key = _highlight_key(content_text, lexer_name, lexer, formatter)
+        parsed = highlight_cache.get(cache_key)
+        cache_hit = parsed is not None
+        if not cache_hit:
+            if _deferred is not None:
+                placeholder = _deferred.add(content_text, lexer_name, lexer, formatter,
+                                            cache_key, data_attrs, self.options)
+                return [nodes.raw('', placeholder, format='html')]
+            parsed = highlight(content_text, lexer, formatter)
+            highlight_cache.put(cache_key, parsed)
+        render_timings.record_highlight(time.perf_counter() - started, cache_hit)
 
+        code = _code_block(lexer_name, parsed, data_attrs, self.options)
         return [nodes.raw('', code, format='html')]
 
 directives.register_directive('code-block', Pygments)
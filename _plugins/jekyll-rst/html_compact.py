@@ -0,0 +1,111 @@
+# Optional compaction of rendered HTML fragments.
+#
+# JEKYLL_RST_COMPACT=1 (or rst2html.py --compact) passes every rendered
+# document through `compact()` as the last pipeline stage:
+#
+#   - runs of whitespace outside <pre>, <code>, <textarea>, <script> and
+#     <style> collapse to a single newline or space, and whitespace between
+#     two block-level tags is dropped
+#   - empty <span></span> wrappers (Pygments emits one per code block) go
+#   - data-mermaid-* attributes repeated on a diagram's <pre> are dropped
+#     when its .mermaid-wrapper div carries the same ones; the theme script
+#     and styles read them from the wrapper
+#
+# Tag and comment contents (attribute values included) are never changed.
+# Tag names are matched in lower case, as docutils writes them (raw HTML is
+# disabled).
+
+import os
+import re
+
+enabled = os.environ.get('JEKYLL_RST_COMPACT', '0') not in ('', '0')
+
+# Compiled by `_compile_patterns` on the first `compact()`, so renders that
+# never compact do not pay for them at start-up
+_PRESERVED = _TAG = _SPACE_RUN = _NEWLINE_RUN = _BLOCK_TAG = _MERMAID_ATTRS = None
+
+
+def _compile_patterns() -> None:
+    global _PRESERVED, _TAG, _SPACE_RUN, _NEWLINE_RUN, _BLOCK_TAG, _MERMAID_ATTRS
+    # Comments and elements whose text is whitespace-sensitive are copied verbatim
+    _PRESERVED = re.compile(r'<!--|<(pre|code|textarea|script|style)\b')
+    _TAG = re.compile(r'(<[^>"\']*(?:(?:"[^"]*"|\'[^\']*\')[^>"\']*)*>)')
+    _SPACE_RUN = re.compile(r'  +')
+    _NEWLINE_RUN = re.compile(r'\n[ \n]+')
+
+    _BLOCK_TAG = re.compile(
+        r'</?(?:address|article|aside|blockquote|caption|col|colgroup|dd|details|div|dl|dt|figcaption|figure'
+        r'|footer|h[1-6]|header|hr|li|main|nav|ol|p|pre|section|summary|table|tbody|td|tfoot|th|thead|tr|ul)\b'
+    )
+
+    _MERMAID_ATTRS = re.compile(
+        r'(<div class="mermaid-wrapper"((?: data-mermaid-[\w-]+="[^"]*")+)>[ \t\n\r\f]*'
+        r'<pre class="language-mermaid")\2>'
+    )
+
+
+def configure(compact=False) -> None:
+    """Enable compaction from the command line flag (also for child processes)."""
+    global enabled
+    if compact:
+        enabled = True
+        os.environ['JEKYLL_RST_COMPACT'] = '1'
+
+
+def compact(html: str) -> str:
+    """Return `html` with insignificant whitespace and redundant markup removed."""
+    if _PRESERVED is None:
+        _compile_patterns()
+    html = _MERMAID_ATTRS.sub(r'\1>', html).replace('<span></span>', '')
+    out = []
+    pos = 0
+    block_before = False
+    while True:
+        m = _PRESERVED.search(html, pos)
+        if m is None:
+            break
+        element = m.group(1)
+        closing = f'</{element}>' if element else '-->'
+        # An unclosed one runs to the end
+        end = html.find(closing, m.end())
+        end = len(html) if end < 0 else end + len(closing)
+        block_after = element == 'pre'
+        out.append(_compact_markup(html[pos:m.start()], block_before, block_after))
+        out.append(html[m.start():end])
+        pos = end
+        block_before = block_after
+    out.append(_compact_markup(html[pos:], block_before, False))
+    return ''.join(out)
+
+
+def _collapse(text: str) -> str:
+    # A whitespace run becomes one newline if it has one, else one space
+    text = text.replace('\t', ' ').replace('\r', ' ').replace('\f', ' ')
+    return _NEWLINE_RUN.sub('\n', _SPACE_RUN.sub(' ', text)).replace(' \n', '\n')
+
+
+def _compact_markup(markup: str, block_before: bool, block_after: bool) -> str:
+    # Split into text, tag, text, ..., text; only the text is touched
+    parts = _TAG.split(markup)
+    if '\0' in markup:
+        texts = [_collapse(text) for text in parts[0::2]]
+    else:
+        # One pass over all the text, kept apart by a separator no run can span
+        texts = _collapse('\0'.join(parts[0::2])).split('\0')
+
+    # Whitespace between two block-level tags renders as nothing
+    tags = parts[1::2]
+    for i, text in enumerate(texts):
+        if text != '\n' and text != ' ':
+            continue
+        before = block_before if i == 0 else _BLOCK_TAG.match(tags[i - 1])
+        after = block_after if i == len(tags) else _BLOCK_TAG.match(tags[i])
+        if before and after:
+            texts[i] = ''
+
+    parts[0::2] = texts
+    return ''.join(parts)
+
+
+def bytes_saved(before: str, after: str) -> int:
+    return len(before.encode('utf-8')) - len(after.encode('utf-8'))
@@ -0,0 +1,172 @@
+# Small content-addressed on-disk cache shared by the RST render pipeline.
+#
+# Entries live in two-level sharded directories (``ab/abcdef....<suffix>``),
+# are written to a temp file and renamed into place so concurrent renders
+# never see partial files, and are evicted least-recently-used first (by
+# mtime, which `get` bumps) once the directory grows past `max_bytes`.
+# The running total is kept in a ``size`` file next to the shards, so a
+# process that stores one entry does not have to scan the whole cache. Every
+# write re-reads and updates it under an exclusive lock on ``size.lock``, so
+# parallel batch workers all add to the same total; eviction recounts it.
+
+import os
+import hashlib
+import tempfile
+import contextlib
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows: the total is best effort there
+    fcntl = None
+
+
+class DiskCache:
+    """ Bounded, sharded cache of text values keyed by hex digests.
+    """
+
+    def __init__(self, directory, max_bytes, suffix='.txt'):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def digest(*parts) -> str:
+        h = hashlib.sha256()
+        for part in parts:
+            if isinstance(part, str):
+                part = part.encode('utf-8')
+            h.update(part)
+            h.update(b'\0')
+        return h.hexdigest()
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + self.suffix)
+
+    def get(self, key: str):
+        """Return the cached text for `key`, or None on a miss."""
+        if not self.enabled:
+            return None
+        path = self.path_for(key)
+        try:
+            with open(path, 'r', encoding='utf-8', newline='') as f:
+                value = f.read()
+        except OSError:
+            self.stats['misses'] += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.stats['hits'] += 1
+        return value
+
+    def put(self, key: str, value: str) -> None:
+        """Store `value` atomically; cache write failures are never fatal."""
+        if not self.enabled:
+            return
+        path = self.path_for(key)
+        data = value.encode('utf-8')
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                # Renamed into place under the lock, so a recount never sees
+                # an entry whose size has not been added to the total yet
+                with self._size_lock():
+                    try:
+                        replaced = os.stat(path).st_size
+                    except OSError:
+                        replaced = 0
+                    size = self.size()
+                    os.replace(tmp_path, path)
+                    size += len(data) - replaced
+                    if size > self.max_bytes:
+                        self._evict()
+                    else:
+                        self._write_size(size)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+        except OSError:
+            return
+        self.stats['writes'] += 1
+
+    def _entries(self):
+        try:
+            shards = list(os.scandir(self.directory))
+        except OSError:
+            return
+        for shard in shards:
+            if not shard.is_dir():
+                continue
+            try:
+                entries = list(os.scandir(shard.path))
+            except OSError:
+                continue
+            for entry in entries:
+                if not entry.name.endswith(self.suffix):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                yield entry.path, st.st_size, st.st_mtime
+
+    def size(self) -> int:
+        """Total bytes on disk, from the ``size`` file (scanned when it is missing or unreadable)."""
+        try:
+            with open(os.path.join(self.directory, 'size'), 'r', encoding='utf-8') as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            return sum(size for _, size, _ in self._entries())
+
+    @contextlib.contextmanager
+    def _size_lock(self):
+        """Hold the lock that serialises updates of the ``size`` file across processes."""
+        try:
+            lock = open(os.path.join(self.directory, 'size.lock'), 'a')
+        except OSError:
+            yield
+            return
+        with lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def _write_size(self, size: int) -> None:
+        path = os.path.join(self.directory, 'size')
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(str(size))
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    def evict(self) -> None:
+        """Drop least-recently-used entries until the cache is at 90% of its bound."""
+        with self._size_lock():
+            self._evict()
+
+    def _evict(self) -> None:
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+                self.stats['evictions'] += 1
+            except OSError:
+                pass
+            total -= size
+        self._write_size(total)
@@ -0,0 +1,162 @@
+# Opt-in per-document instrumentation for the RST render pipeline.
+#
+# JEKYLL_RST_TIMINGS=<file> (or rst2html.py --timings=<file>) appends one JSON
+# line per rendered document with the wall time of each stage, the Pygments
+# highlight calls made while rendering it (with cache hits and misses) and how
+# far it raised the process's peak memory. JEKYLL_RST_PROFILE_DIR=<dir>
+# (--profile-dir) also writes a cProfile stats file and the preprocessed
+# docutils input for each document. scripts/rst_timings_report.py aggregates
+# the JSON lines.
+#
+# With neither set, every hook below is a no-op.
+
+import os
+import sys
+import time
+import contextlib
+
+timings_path = os.environ.get('JEKYLL_RST_TIMINGS') or None
+profile_dir = os.environ.get('JEKYLL_RST_PROFILE_DIR') or None
+
+# Timings of the document currently being rendered by this process
+_current = None
+
+
+def configure(timings=None, profile=None) -> None:
+    """Enable instrumentation from command line flags (also for child processes)."""
+    global timings_path, profile_dir
+    if timings:
+        timings_path = os.environ['JEKYLL_RST_TIMINGS'] = os.path.abspath(timings)
+    if profile:
+        profile_dir = os.environ['JEKYLL_RST_PROFILE_DIR'] = os.path.abspath(profile)
+
+
+def enabled() -> bool:
+    return bool(timings_path or profile_dir)
+
+
+def _peak_rss_kb():
+    """The process's peak resident set size so far, or None where unavailable."""
+    try:
+        import resource
+    except ImportError:  # Not available on Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS, kilobytes elsewhere
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+class DocumentTimings:
+    """ Stage timings collected while rendering one document.
+    """
+
+    def __init__(self, source_path):
+        self.source_path = source_path
+        self.started = time.perf_counter()
+        self.peak_rss_kb = _peak_rss_kb()
+        self.stages = {}
+        self.highlight = {'calls': 0, 'cache_hits': 0, 'cache_misses': 0, 'seconds': 0.0}
+        self.cached = False
+        self.preprocessed = None
+        self.bytes_saved = None
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - started
+
+    def peak_rss_growth_kb(self):
+        """
+        How much the process's peak RSS grew while rendering this document:
+        0 unless it needed more memory than anything the process did before.
+        tracemalloc would give an exact figure but slows rendering severalfold.
+        """
+        peak = _peak_rss_kb()
+        return None if peak is None else peak - self.peak_rss_kb
+
+    def as_dict(self) -> dict:
+        highlight = dict(self.highlight, seconds=round(self.highlight['seconds'], 6))
+        return {
+            'source_path': self.source_path,
+            'seconds': round(time.perf_counter() - self.started, 6),
+            'cached': self.cached,
+            'stages': {name: round(seconds, 6) for name, seconds in self.stages.items()},
+            'highlight': highlight,
+            'bytes_saved': self.bytes_saved,
+            'peak_rss_growth_kb': self.peak_rss_growth_kb(),
+            'pid': os.getpid(),
+        }
+
+
+def stage(name: str):
+    """Context manager timing `name` for the current document, if any."""
+    if _current is None:
+        return contextlib.nullcontext()
+    return _current.stage(name)
+
+
+def record_highlight(seconds: float, cache_hit: bool) -> None:
+    """Count one Pygments highlight (or highlight cache read) for the current document."""
+    if _current is None:
+        return
+    _current.highlight['calls'] += 1
+    _current.highlight['cache_hits' if cache_hit else 'cache_misses'] += 1
+    _current.highlight['seconds'] += seconds
+
+
+def _profile_name(source_path) -> str:
+    if not source_path:
+        return 'stdin'
+    return os.path.splitext(os.path.basename(source_path))[0]
+
+
+@contextlib.contextmanager
+def document(source_path=None):
+    """
+    Instrument the render of one document. Yields the `DocumentTimings`
+    (None when instrumentation is off); its record is written on exit.
+    """
+    global _current
+    if not enabled():
+        yield None
+        return
+
+    profiler = None
+    if profile_dir:
+        import cProfile
+        profiler = cProfile.Profile()
+
+    timings = _current = DocumentTimings(source_path)
+    if profiler:
+        profiler.enable()
+    try:
+        yield timings
+    finally:
+        if profiler:
+            profiler.disable()
+        _current = None
+        _write(timings, profiler)
+
+
+def _write(timings: DocumentTimings, profiler) -> None:
+    record = timings.as_dict()
+    # Instrumentation must never break a build
+    try:
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+            name = _profile_name(timings.source_path)
+            profiler.dump_stats(os.path.join(profile_dir, name + '.prof'))
+            if timings.preprocessed is not None:
+                with open(os.path.join(profile_dir, name + '.rst'), 'w', encoding='utf-8') as f:
+                    f.write(timings.preprocessed)
+        if timings_path:
+            import json
+            line = json.dumps(record) + '\n'
+            # One write per record so parallel batch workers can share the file
+            with open(timings_path, 'a', encoding='utf-8') as f:
+                f.write(line)
+    except OSError:
+        pass
@@ -16,14 +16,16 @@
 A front end to docutils, producing HTML with syntax colouring using pygments
 """
 
+# As in docutils' own front ends: LC_TIME and friends follow the environment
+# (the `date` directive formats with strftime). Nearly free, as docutils.io
+# imports `locale` anyway.
 try:
     import locale
     locale.setlocale(locale.LC_ALL, '')
 except:
     pass
 
-from transform import transform
-from docutils.writers.html4css1 import Writer
+from transform import transform, Writer
 from docutils.core import default_description
 from directives import Pygments
 
@@ -36,4 +38,7 @@ def main():
     return transform(writer=Writer(), part='html_body')
 
 if __name__ == '__main__':
-    print(main())
+    output = main()
+    # `--worker` mode streams its own responses and returns None
+    if output is not None:
+        print(output)
@@ -1,62 +1,44 @@
+import io
+import os
+import copy
 import sys
 import re
-from docutils.core import publish_parts
-from optparse import OptionParser
-from docutils.frontend import OptionParser as DocutilsOptionParser
+import time
+import hashlib
+import marshal
+from contextlib import redirect_stderr
+from docutils.core import publish_parts, Publisher
+from docutils.utils import DependencyList, Reporter
+from optparse import OptionParser, Values as OptionValues
+from docutils.frontend import OptionParser as DocutilsOptionParser, Values
 from docutils.parsers.rst import Parser
-
-
-def _assign_section_ids_to_headings(html: str) -> str:
-    """
-    Docutils (for RST) puts the anchor ID on the surrounding div.section, e.g.:
-      <div class="section" id="my-heading-slug">
-        <h2>My Heading</h2>
-        ...
-    The theme's TOC (tocbot) expects the ID on the heading itself. This post-processor
-    copies the div.section id onto the first heading tag inside the section if the
-    heading does not already have an id.
-    """
-    # Pattern to find the opening of a section with an id
-    section_open_pat = re.compile(r'<div\s+class="section"\s+id="([^"]+)">', re.IGNORECASE)
-
-    result_parts = []
-    pos = 0
-
-    for m in section_open_pat.finditer(html):
-        div_id = m.group(1)
-        div_end = m.end()
-
-        # Append everything up to and including the <div ...> we just matched
-        result_parts.append(html[pos:div_end])
-
-        # From here, try to match optional whitespace then an opening heading tag
-        # that does not already contain an id attribute
-        after = html[div_end:]
-        heading_match = re.match(r'(\s*)<(h[1-6])([^>]*)>', after, re.IGNORECASE)
-
-        if heading_match:
-            attrs = heading_match.group(3)
-            # If heading already has an id, leave as-is
-            if re.search(r'\bid\s*=',''.join(attrs), re.IGNORECASE):
-                # Append the original opening heading tag unchanged
-                result_parts.append(heading_match.group(0))
-            else:
-                # Inject the id from the parent section onto the heading
-                leading_ws = heading_match.group(1)
-                tag = heading_match.group(2)
-                new_open = f"{leading_ws}<{tag}{attrs} id=\"{div_id}\">"
-                result_parts.append(new_open)
-
-            # Advance the cursor past the heading opening tag we processed
-            pos = div_end + len(heading_match.group(0))
-        else:
-            # No immediate heading; just continue scanning from the end of this div
-            pos = div_end
-
-    # Append the remaining tail
-    result_parts.append(html[pos:])
-
-    return ''.join(result_parts)
+from docutils.readers import standalone
+from docutils.writers import html4css1, get_writer_class
+from render_cache import DiskCache
+import render_timings
+import html_compact
+import directives
+
+_PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Final rendered fragments keyed by preprocessed source, settings, part and
+# toolchain. JEKYLL_RST_CACHE_DIR moves it; JEKYLL_RST_CACHE_MAX_MB bounds it
+# (0 disables caching).
+_fragment_cache = DiskCache(
+    os.environ.get('JEKYLL_RST_CACHE_DIR') or os.path.join(_PLUGIN_DIR, '../../.rst-cache'),
+    int(float(os.environ.get('JEKYLL_RST_CACHE_MAX_MB', '64')) * 1024 * 1024),
+)
+_toolchain_fingerprint = None
+_config_file_stamps = None
+
+# Resolved docutils settings objects, keyed by overrides and writer class
+_settings_cache = {}
+
+# Parsed command lines and resolved settings of the front end, kept between
+# runs in the fragment cache directory (see `_load_snapshot`)
+_SNAPSHOT_NAME = 'cli-settings.marshal'
+_SNAPSHOT_MAX_ENTRIES = 16
+_snapshot = None
 
 
 def _apply_custom_table_width(html: str) -> str:
@@ -65,6 +47,7 @@ def _apply_custom_table_width(html: str) -> str:
     width value into an inline style on the surrounding .table-wrapper or table.
     The class is produced by our extended list-table directive option
     ':custom-table-width:' where <value> is a CSS length or percent.
+    `HTMLTranslator.visit_table` applies this to each table start tag.
     """
     # Match classes like rst-cw-960px, rst-cw-80pct, rst-cw-120ch, etc.
     # Capture the width value after rst-cw- until a space or end of class string
@@ -101,170 +84,382 @@ def _apply_custom_table_width(html: str) -> str:
 
     return ''.join(out)
 
-def _transform_mermaid_blocks(html: str) -> str:
-    """
-    Transform mermaid code blocks from RST output into the format expected by
-    the Chirpy theme's JavaScript (which looks for .language-mermaid class).
 
-    RST produces code blocks that start with "mindmap" (mermaid's mindmap syntax)
-    We need: <pre class="language-mermaid"><code>...</code></pre>
+class HTMLTranslator(html4css1.HTMLTranslator):
+    """
+    html4css1 translator with the site's markup tweaks applied while the HTML
+    is generated, instead of as regex passes over the finished fragment.
+    """
 
-    Also extracts data-mermaid-* attributes for custom sizing.
+    def section_title_tags(self, node):
+        """
+        Docutils (for RST) puts the anchor ID on the surrounding div.section, e.g.:
+          <div class="section" id="my-heading-slug">
+            <h2>My Heading</h2>
+        The theme's TOC (tocbot) expects the ID on the heading itself, so copy the
+        section id onto the heading unless the heading already has one. Sections
+        with extra classes or ids are left alone, as before.
+        """
+        start_tag, close_tag = super().section_title_tags(node)
+        with render_timings.stage('writer.heading_ids'):
+            section = node.parent
+            if len(section['ids']) == 1 and not section['classes'] and not node['ids']:
+                end = start_tag.index('>')
+                section_id = self.attval(section['ids'][0])
+                start_tag = f'{start_tag[:end]} id="{section_id}"{start_tag[end:]}'
+        return start_tag, close_tag
+
+    def visit_table(self, node):
+        super().visit_table(node)
+        # ':custom-table-width:' arrives as an 'rst-cw-<value>' class
+        if any('rst-cw-' in cls for cls in node['classes']):
+            with render_timings.stage('writer.table_width'):
+                self.body[-1] = _apply_custom_table_width(self.body[-1])
+
+
+class Writer(html4css1.Writer):
+    """ html4css1 writer using `HTMLTranslator`.
     """
-    # Pattern to match code blocks with optional data attributes
-    # Capture the figure tag with any data-mermaid-* attributes
-    pattern = re.compile(
-        r'<figure\s+class="code"([^>]*)>.*?<td\s+class="code"><pre><code\s+class="[^"]*">(.*?)</code></pre></td>.*?</figure>',
-        re.DOTALL | re.IGNORECASE
-    )
 
-    def replace_mermaid(match):
-        import html
-        # Extract figure attributes (group 1) and code content (group 2)
-        figure_attrs = match.group(1)
-        code_content = match.group(2)
-        # Remove line number spans and reconstruct plain text
-        # The content has structure like: <span class="line"><span></span>text</span>
-        lines = re.findall(r'<span class="line">(?:<span></span>)?(.*?)</span>', code_content, re.DOTALL)
-
-        # Clean up: preserve empty lines and indentation
-        cleaned_lines = []
-        for line in lines:
-            # Unescape HTML entities (&amp; -> &, &lt; -> <, etc.)
-            line = html.unescape(line)
-            # Preserve empty lines - mermaid syntax may need them
-            cleaned_lines.append(line.rstrip() if line.strip() else '')
-
-        # Join with newlines - preserve structure including blank lines
-        clean_content = '\n'.join(cleaned_lines).strip()
-
-        # Check if this looks like a mermaid diagram (starts with mermaid keywords)
-        mermaid_keywords = ['mindmap', 'graph', 'flowchart', 'sequenceDiagram', 'classDiagram',
-                           'stateDiagram', 'erDiagram', 'gantt', 'pie', 'journey', 'gitGraph']
-        first_word = clean_content.strip().split()[0] if clean_content.strip() else ''
-
-        if first_word in mermaid_keywords:
-            # Extract data-mermaid-* attributes if present
-            data_attrs = ''
-            if figure_attrs:
-                # Extract data-mermaid-width, data-mermaid-height, data-mermaid-scale
-                # Use more flexible regex to handle various spacing/formatting
-                width_match = re.search(r'data-mermaid-width\s*=\s*["\']([^"\']+)["\']', figure_attrs, re.IGNORECASE)
-                height_match = re.search(r'data-mermaid-height\s*=\s*["\']([^"\']+)["\']', figure_attrs, re.IGNORECASE)
-                scale_match = re.search(r'data-mermaid-scale\s*=\s*["\']([^"\']+)["\']', figure_attrs, re.IGNORECASE)
-
-                if width_match:
-                    width_val = width_match.group(1).strip()
-                    data_attrs += f' data-mermaid-width="{width_val}"'
-                if height_match:
-                    height_val = height_match.group(1).strip()
-                    data_attrs += f' data-mermaid-height="{height_val}"'
-                if scale_match:
-                    scale_val = scale_match.group(1).strip()
-                    data_attrs += f' data-mermaid-scale="{scale_val}"'
-
-            # Wrap in a div to isolate from surrounding content and prevent DOM interference
-            # Also add data attributes to the pre tag as fallback (in case Mermaid removes the wrapper)
-            # This ensures data attributes are preserved even if Mermaid processes the code block
-            return f'<div class="mermaid-wrapper"{data_attrs}>\n<pre class="language-mermaid"{data_attrs}><code>{clean_content}</code></pre>\n</div>\n'
-        else:
-            # Not a mermaid block, return original
-            return match.group(0)
+    def __init__(self):
+        super().__init__()
+        self.translator_class = HTMLTranslator
+
+
+def _is_md_table_border(line: str) -> bool:
+    # Matches header separator like: | --- | :---: | ---- |
+    if '|' not in line or '-' not in line:
+        return False
+    if not line.strip().startswith('|') or not line.strip().endswith('|'):
+        return False
+    segments = [seg.strip() for seg in line.strip().split('|')[1:-1]]
+    if not segments:
+        return False
+    for seg in segments:
+        # Allow sequences of dashes with optional leading/trailing colons
+        core = seg.replace(':', '')
+        if len(core) < 3 or core.strip('-'):
+            return False
+    return True
 
-    return pattern.sub(replace_mermaid, html)
 
-def _convert_markdown_tables_to_grid(rst_text: str) -> str:
-    """
-    Convert simple Markdown pipe tables into reStructuredText grid tables.
+def _is_md_table_row(line: str) -> bool:
+    if '|' not in line:
+        return False
+    s = line.strip()
+    return s.startswith('|') and s.endswith('|') and ('|' in s[1:-1])
 
-    This allows authors to write Markdown-style tables in `.rst` files without
-    changing content, while keeping docutils satisfied.
+
+def _parse_md_row(line: str) -> list:
+    # Split between pipes and trim whitespace, preserving empty cells
+    return [cell.strip() for cell in line.strip().split('|')[1:-1]]
+
+
+def _is_grid_border(line: str) -> bool:
+    if '+' not in line:
+        return False
+    s = line.strip('\n')
+    if not s.startswith('+') or not s.endswith('+'):
+        return False
+    body = s[1:-1]
+    return not body.strip('-=+')
+
+
+def _is_grid_row(line: str) -> bool:
+    s = line.rstrip('\n')
+    return s.startswith('|') and s.endswith('|')
+
+
+def _split_grid_row(line: str) -> list:
+    # Keep internal spacing as content; strip only outer spaces
+    cells = line[1:-1].split('|')
+    return [c[1:-1] if len(c) >= 2 and c.startswith(' ') and c.endswith(' ') else c.strip() for c in cells]
+
+
+def _is_adornment(line: str) -> bool:
+    if not line:
+        return False
+    ch = line[0]
+    if ch not in "=-~`^\"'*+#<>_":
+        return False
+    # Every non-blank character is `ch`
+    return not line.strip().strip(ch)
+
+
+def _grid_border(widths: list, sep: str) -> str:
+    # Build a horizontal border using sep ('-' or '=')
+    parts = ['+']
+    for w in widths:
+        parts.append(sep * (w + 2))
+        parts.append('+')
+    return ''.join(parts)
+
+
+def _grid_row(widths: list, cells: list) -> str:
+    # '| cell1   | cell2 |' with each cell left-justified to its column width;
+    # missing trailing cells are blank
+    if len(cells) < len(widths):
+        cells = cells + [''] * (len(widths) - len(cells))
+    return '| ' + ' | '.join(map(str.ljust, cells, widths)) + ' |'
+
+
+# Line classes for the single-pass preprocessor. Bit flags, since one line
+# can be several things at once (e.g. '+++' is a grid border and an adornment).
+_MD_ROW = 1
+_MD_BORDER = 2
+_GRID_BORDER = 4
+_GRID_ROW = 8
+_ADORNMENT = 16
+
+
+def _classify(line: str) -> int:
+    flags = 0
+    if '|' in line:
+        if _is_md_table_row(line):
+            flags |= _MD_ROW
+        if _is_md_table_border(line):
+            flags |= _MD_BORDER
+        if _is_grid_row(line):
+            flags |= _GRID_ROW
+    if _is_grid_border(line):
+        flags |= _GRID_BORDER
+    if _is_adornment(line):
+        flags |= _ADORNMENT
+    return flags
+
+
+def _column_widths(rows: list) -> list:
+    # Widest cell of each column; short rows count as blank cells
+    cols = max(map(len, rows))
+    if any(len(cells) != cols for cells in rows):
+        rows = [cells + [''] * (cols - len(cells)) for cells in rows]
+    return [max(map(len, column)) for column in zip(*rows)]
+
+
+def _widen(widths: list, other: list) -> None:
+    # Grow `widths` in place to at least `other`, column by column
+    if len(other) > len(widths):
+        widths.extend([0] * (len(other) - len(widths)))
+    widths[:len(other)] = map(max, widths, other)
+
+
+class _Table:
+    """ One table, parsed once and rendered once as a grid table.
+
+    Built from Markdown pipe tables and/or grid table lines: a pipe table
+    directly followed by grid lines is one table, as docutils would see it
+    after conversion. Holds the rows of cells, the width of each column and
+    how many rows came before the first '=' border (the header separator).
     """
-    lines = rst_text.splitlines()
 
-    def is_md_table_border(line: str) -> bool:
-        # Matches header separator like: | --- | :---: | ---- |
-        if not line.strip().startswith('|') or not line.strip().endswith('|'):
-            return False
-        segments = [seg.strip() for seg in line.strip().split('|')[1:-1]]
-        if not segments:
+    def __init__(self):
+        self.rows = []
+        self.widths = []
+        self.header_rows = None
+
+    def add_markdown(self, lines: list, start: int, end: int) -> None:
+        # Header row, separator, body rows. Every column is at least one
+        # character wide and the header is followed by a '=' border.
+        rows = [_parse_md_row(lines[start])] + [_parse_md_row(line) for line in lines[start + 2:end]]
+        if self.header_rows is None:
+            self.header_rows = len(self.rows) + 1
+        self.rows.extend(rows)
+        _widen(self.widths, [max(w, 1) for w in _column_widths(rows)])
+
+    def add_grid(self, lines: list, flags: list, start: int, end: int) -> None:
+        rows = []
+        for j in range(start, end):
+            if not flags[j] & _GRID_BORDER:
+                rows.append(_split_grid_row(lines[j]))
+            elif self.header_rows is None:
+                # Detect header separator with '='
+                line = lines[j]
+                if set(line.replace('+', '').strip()) <= {'='} and '=' in line:
+                    self.header_rows = len(self.rows) + len(rows)
+        if rows:
+            self.rows.extend(rows)
+            _widen(self.widths, _column_widths(rows))
+
+    def render(self, out: list, out_flags: list) -> None:
+        widths = self.widths
+        rule = _grid_border(widths, '-')
+        rows = iter(self.rows)
+        out.append(rule)
+        out_flags.append(_GRID_BORDER)
+        # A header separator after at most one row makes the first row the header
+        if self.header_rows is not None and self.header_rows <= 1:
+            out.append(_grid_row(widths, next(rows)))
+            out.append(_grid_border(widths, '='))
+            out_flags += [_GRID_ROW, _GRID_BORDER]
+        for cells in rows:
+            out.append(_grid_row(widths, cells))
+            out.append(rule)
+            out_flags += [_GRID_ROW, _GRID_BORDER]
+
+
+_GRID_RULE = re.compile(r'\+(?:--+\+)+')
+
+
+def _is_normalized_grid(lines: list, start: int, end: int) -> bool:
+    """
+    True when ``lines[start:end]`` is a grid table exactly as `_Table.render`
+    would write it, so it can be left in place without being parsed. Checks
+    whole lines against the top border and the cell widths it implies.
+    """
+    rule = lines[start]
+    count = end - start
+    if count < 3 or not count % 2 or not _GRID_RULE.fullmatch(rule):
+        return False
+    if lines[start + 2] != rule and lines[start + 2] != rule.replace('-', '='):
+        return False
+    borders = lines[start + 4:end:2]
+    if borders.count(rule) != len(borders):
+        return False
+    # Each row: '|' exactly where the border has '+', one space inside each
+    lengths = [len(segment) for segment in rule.split('+')]
+    cols = len(lengths) - 2
+    for row in lines[start + 1:end:2]:
+        if row.count(' |') != cols or row.count('| ') != cols or list(map(len, row.split('|'))) != lengths:
             return False
-        for seg in segments:
-            # Allow sequences of dashes with optional leading/trailing colons
-            core = seg.replace(':', '')
-            if len(core) < 3 or not set(core) <= {'-'}:
-                return False
-        return True
+    return True
 
-    def is_md_table_row(line: str) -> bool:
-        s = line.strip()
-        return s.startswith('|') and s.endswith('|') and ('|' in s[1:-1])
 
-    def parse_row(line: str) -> list:
-        # Split between pipes and trim whitespace, preserving empty cells
-        return [cell.strip() for cell in line.strip().split('|')[1:-1]]
+def _md_table_at(flags: list, j: int) -> bool:
+    # Markdown table: header row followed by a separator line
+    return bool(flags[j] & _MD_ROW) and j + 1 < len(flags) and bool(flags[j + 1] & _MD_BORDER)
 
-    i = 0
-    out_lines = []
+
+def _table_stage(lines: list, flags: list, markdown=True, grid=True):
+    """
+    Convert Markdown pipe tables (`markdown`) and reconstruct grid tables
+    with consistent borders and column widths (`grid`). Each table is parsed
+    once into a `_Table` and rendered once; grid tables that are already
+    normalized are left untouched. Returns new ``(lines, flags)``.
+    """
+    mask = (_MD_ROW if markdown else 0) | (_GRID_BORDER if grid else 0)
+    starts = [k for k, f in enumerate(flags) if f & mask]
+    if not starts:
+        return lines, flags
+
+    out, out_flags = [], []
+    n = len(lines)
+    i = scanned = 0
+    for k in starts:
+        if k < scanned:
+            continue
+
+        # Find the extent of the table: Markdown tables and runs of grid
+        # lines, starting at a Markdown header or a grid border
+        pieces = []
+        j = k
+        while j < n:
+            if markdown and _md_table_at(flags, j):
+                end = j + 2
+                while end < n and flags[end] & _MD_ROW:
+                    end += 1
+                pieces.append((True, j, end))
+            elif grid and flags[j] & (_GRID_BORDER if j == k else _GRID_BORDER | _GRID_ROW):
+                end = j + 1
+                while (end < n and flags[end] & (_GRID_BORDER | _GRID_ROW)
+                       and not (markdown and _md_table_at(flags, end))):
+                    end += 1
+                pieces.append((False, j, end))
+            else:
+                break
+            j = end
+            if not grid:
+                break
+        scanned = j
+
+        if not pieces or (len(pieces) == 1 and not pieces[0][0] and _is_normalized_grid(lines, k, j)):
+            continue
+
+        table = _Table()
+        for is_markdown, start, end in pieces:
+            if is_markdown:
+                table.add_markdown(lines, start, end)
+            else:
+                table.add_grid(lines, flags, start, end)
+        if not table.rows:
+            # Borders only: passed through unchanged
+            continue
+
+        out.extend(lines[i:k])
+        out_flags.extend(flags[i:k])
+        table.render(out, out_flags)
+        i = j
+
+    if not i:
+        return lines, flags
+    out.extend(lines[i:])
+    out_flags.extend(flags[i:])
+    return out, out_flags
+
+
+def _heading_stage(lines: list, flags: list) -> list:
+    """
+    Make underline/overline adornment lengths match their title. A line can
+    only change if it or the next line is an adornment, so only those
+    positions are visited (lookahead of two lines).
+    """
+    adornments = [k for k, f in enumerate(flags) if f & _ADORNMENT]
+    if not adornments:
+        return lines
+
+    out = []
     n = len(lines)
-    while i < n:
-        # Try to detect Markdown table block: header row + border line
-        if i + 1 < n and is_md_table_row(lines[i]) and is_md_table_border(lines[i + 1]):
-            header_cells = parse_row(lines[i])
-            j = i + 2
-            body_rows = []
-            while j < n and is_md_table_row(lines[j]):
-                body_rows.append(parse_row(lines[j]))
-                j += 1
-
-            # Normalize column count
-            num_cols = max(len(header_cells), max((len(r) for r in body_rows), default=0))
-            header_cells += [''] * (num_cols - len(header_cells))
-            normalized_rows = []
-            for r in body_rows:
-                r = r + [''] * (num_cols - len(r))
-                normalized_rows.append(r)
-
-            # Compute column widths
-            col_widths = [0] * num_cols
-            for idx in range(num_cols):
-                widths = [len(header_cells[idx])] + [len(r[idx]) for r in normalized_rows]
-                col_widths[idx] = max(widths + [1])
-
-            def horiz(sep: str) -> str:
-                # Build a horizontal border using sep ('-' or '=')
-                parts = ['+']
-                for w in col_widths:
-                    parts.append(sep * (w + 2))
-                    parts.append('+')
-                return ''.join(parts)
-
-            def row_line(cells: list) -> str:
-                parts = ['|']
-                for idx, w in enumerate(col_widths):
-                    cell = cells[idx]
-                    pad = ' ' * (w - len(cell))
-                    parts.append(' ' + cell + pad + ' ')
-                    parts.append('|')
-                return ''.join(parts)
-
-            # Emit grid table
-            out_lines.append(horiz('-'))
-            out_lines.append(row_line(header_cells))
-            out_lines.append(horiz('='))  # header separator
-            for r in normalized_rows:
-                out_lines.append(row_line(r))
-                out_lines.append(horiz('-'))
-
-            # Advance
-            i = j
+    i = 0
+    for a in adornments:
+        if a < i:
             continue
+        # Lines before a - 1 can be neither a title nor an adornment
+        j = max(i, a - 1)
+        out.extend(lines[i:j])
+
+        # Overline style: adorn, title, adorn
+        if j + 2 < n and flags[j] & _ADORNMENT and not flags[j + 1] & _ADORNMENT and flags[j + 2] & _ADORNMENT:
+            ch = lines[j][0]
+            title = lines[j + 1].rstrip('\n')
+            width = len(title)
+            out.append(ch * width)
+            out.append(title)
+            out.append(ch * width)
+            i = j + 3
+        # Underline style: title, adorn
+        elif j + 1 < n and not flags[j] & _ADORNMENT and flags[j + 1] & _ADORNMENT:
+            ch = lines[j + 1][0]
+            title = lines[j].rstrip('\n')
+            out.append(title)
+            out.append(ch * len(title))
+            i = j + 2
+        else:
+            out.append(lines[j])
+            i = j + 1
+
+    out.extend(lines[i:])
+    return out
+
 
-        # Fallback: passthrough
-        out_lines.append(lines[i])
-        i += 1
+def _drop_final_blank(lines: list, flags: list):
+    """
+    Mirror ``'\\n'.join(lines).splitlines()``, which loses a final empty line,
+    so chained stages match the original separate string passes exactly.
+    """
+    if lines and lines[-1] == '':
+        return lines[:-1], flags[:-1]
+    return lines, flags
+
+
+def _convert_markdown_tables_to_grid(rst_text: str) -> str:
+    """
+    Convert simple Markdown pipe tables into reStructuredText grid tables.
+
+    This allows authors to write Markdown-style tables in `.rst` files without
+    changing content, while keeping docutils satisfied.
+    """
+    lines = rst_text.splitlines()
+    return '\n'.join(_table_stage(lines, [_classify(line) for line in lines], grid=False)[0])
 
-    return '\n'.join(out_lines)
 
 def _normalize_grid_tables(rst_text: str) -> str:
     """
@@ -273,92 +468,8 @@ def _normalize_grid_tables(rst_text: str) -> str:
     that can happen when content is manually authored.
     """
     lines = rst_text.splitlines()
+    return '\n'.join(_table_stage(lines, [_classify(line) for line in lines], markdown=False)[0])
 
-    def is_border(line: str) -> bool:
-        s = line.strip('\n')
-        if not s.startswith('+') or not s.endswith('+'):
-            return False
-        body = s[1:-1]
-        return set(body) <= {'-', '=', '+'}
-
-    def is_row(line: str) -> bool:
-        s = line.rstrip('\n')
-        return s.startswith('|') and s.endswith('|')
-
-    def split_row(line: str) -> list:
-        # Keep internal spacing as content; strip only outer spaces
-        cells = line[1:-1].split('|')
-        return [c[1:-1] if len(c) >= 2 and c.startswith(' ') and c.endswith(' ') else c.strip() for c in cells]
-
-    i = 0
-    out = []
-    n = len(lines)
-    while i < n:
-        if is_border(lines[i]):
-            # Start capturing a table block
-            j = i
-            rows = []
-            borders = []
-            header_sep_idx = None
-            while j < n and (is_border(lines[j]) or is_row(lines[j])):
-                if is_border(lines[j]):
-                    borders.append(lines[j])
-                    # Detect header separator with '='
-                    if header_sep_idx is None and set(lines[j].replace('+', '').strip()) <= {'='} and '=' in lines[j]:
-                        header_sep_idx = len(rows)  # number of data rows seen so far
-                else:
-                    rows.append(split_row(lines[j]))
-                j += 1
-
-            if rows:
-                num_cols = max(len(r) for r in rows)
-                # Pad rows
-                norm_rows = [r + [''] * (num_cols - len(r)) for r in rows]
-                # Compute widths
-                widths = [1] * num_cols
-                for c in range(num_cols):
-                    widths[c] = max(len(r[c]) for r in norm_rows)
-
-                def mk_border(ch: str) -> str:
-                    parts = ['+']
-                    for w in widths:
-                        parts.append(ch * (w + 2))
-                        parts.append('+')
-                    return ''.join(parts)
-
-                def mk_row(cells: list) -> str:
-                    parts = ['|']
-                    for idx, w in enumerate(widths):
-                        cell = cells[idx]
-                        pad = ' ' * (w - len(cell))
-                        parts.append(' ' + cell + pad + ' ')
-                        parts.append('|')
-                    return ''.join(parts)
-
-                # Re-emit table
-                out.append(mk_border('-'))
-                # If a header separator was detected, treat first row as header
-                if header_sep_idx is not None and header_sep_idx <= 1:
-                    # Emit header (first row), header border, then remaining
-                    out.append(mk_row(norm_rows[0]))
-                    out.append(mk_border('='))
-                    for r in norm_rows[1:]:
-                        out.append(mk_row(r))
-                        out.append(mk_border('-'))
-                else:
-                    # No explicit header; emit all rows with '-' borders between
-                    for idx, r in enumerate(norm_rows):
-                        out.append(mk_row(r))
-                        out.append(mk_border('-'))
-
-                i = j
-                continue
-
-        # passthrough non-table line
-        out.append(lines[i])
-        i += 1
-
-    return '\n'.join(out)
 
 def _normalize_heading_adornments(rst_text: str) -> str:
     """
@@ -366,45 +477,27 @@ def _normalize_heading_adornments(rst_text: str) -> str:
     Fixes warnings like 'Title underline too short.'
     """
     lines = rst_text.splitlines()
-    out = []
+    return '\n'.join(_heading_stage(lines, [_classify(line) for line in lines]))
 
-    def is_adornment(line: str) -> bool:
-        if not line:
-            return False
-        ch = line[0]
-        if ch not in "=-~`^\"'*+#<>_":
-            return False
-        return all(c == ch for c in line.strip())
 
-    i = 0
-    n = len(lines)
-    while i < n:
-        # Overline style: adorn, title, adorn
-        if i + 2 < n and is_adornment(lines[i]) and not is_adornment(lines[i+1]) and is_adornment(lines[i+2]):
-            ch = lines[i][0]
-            title = lines[i+1].rstrip('\n')
-            width = len(title)
-            out.append(ch * width)
-            out.append(title)
-            out.append(ch * width)
-            i += 3
-            continue
-
-        # Underline style: title, adorn
-        if i + 1 < n and not is_adornment(lines[i]) and is_adornment(lines[i+1]):
-            ch = lines[i+1][0]
-            title = lines[i].rstrip('\n')
-            width = len(title)
-            out.append(title)
-            out.append(ch * width)
-            i += 2
-            continue
+def _preprocess_rst(rst_text: str) -> str:
+    """
+    Apply all three normalizations with one split, one classification per
+    line and one join. Output is identical to running
+    `_convert_markdown_tables_to_grid`, `_normalize_grid_tables` and
+    `_normalize_heading_adornments` in sequence.
+    """
+    with render_timings.stage('preprocess.classify'):
+        lines = rst_text.splitlines()
+        flags = [_classify(line) for line in lines]
+    with render_timings.stage('preprocess.tables'):
+        # Twice, as the separate Markdown and grid string passes did
+        lines, flags = _drop_final_blank(*_drop_final_blank(*_table_stage(lines, flags)))
+    with render_timings.stage('preprocess.headings'):
+        return '\n'.join(_heading_stage(lines, flags))
 
-        out.append(lines[i])
-        i += 1
 
-    return '\n'.join(out)
-def transform(writer=None, part=None):
+def _build_option_parser(writer=None, part=None):
     p = OptionParser(add_help_option=False)
 
     # Collect all the command line options
@@ -414,9 +507,24 @@ def transform(writer=None, part=None):
 
     p.add_option('--part', default=part)
     p.add_option('--source-path', default=None, help='Path to the source file for error reporting')
-
-    opts, args = p.parse_args()
-
+    p.add_option('--worker', action='store_true', default=False,
+                 help='Serve newline-delimited JSON render requests on stdin')
+    p.add_option('--batch-output', default=None, metavar='<dir>',
+                 help='Render every file/directory argument into <dir> with a manifest')
+    p.add_option('--jobs', type='int', default=None,
+                 help='Worker processes for --batch-output (default: CPU count)')
+    p.add_option('--incremental', action='store_true', default=False,
+                 help='With --batch-output, only re-render documents whose fingerprint changed')
+    p.add_option('--timings', default=None, metavar='<file>',
+                 help='Append per-stage render timings as JSON lines to <file>')
+    p.add_option('--profile-dir', default=None, metavar='<dir>',
+                 help='Write a cProfile dump and the preprocessed input per document to <dir>')
+    p.add_option('--compact', action='store_true', default=False,
+                 help='Remove insignificant whitespace and redundant markup from the HTML')
+    return p
+
+
+def _base_settings(opts) -> dict:
     settings = dict({
         'file_insertion_enabled': False,
         'raw_enabled': False,
@@ -439,91 +547,675 @@ def transform(writer=None, part=None):
         # Never abort on non-severe messages
         'halt_level': 5,
     }, **opts.__dict__)
+    # Front-end only options, not docutils settings
+    for key in ('worker', 'batch_output', 'jobs', 'incremental', 'timings', 'profile_dir', 'compact'):
+        settings.pop(key, None)
+    return settings
 
-    # Track source file for better error messages
-    source_path = opts.source_path
-    if len(args) == 1:
-        try:
-            content = open(args[0], 'r').read()
-            if not source_path:
-                source_path = args[0]
-        except IOError:
-            content = args[0]
-    else:
-        content = sys.stdin.read()
 
-    # Preprocess: convert Markdown-style pipe tables to RST grid tables
+def _preprocess(content: str) -> str:
+    # Preprocess in a single pass: Markdown pipe tables -> grid tables,
+    # normalize grid table widths, then match heading adornments to titles
     try:
-        content = _convert_markdown_tables_to_grid(content)
+        content = _preprocess_rst(content)
     except Exception:
-        # Do not fail the build if preprocessing encounters unexpected input
-        pass
+        # Do not fail the build if preprocessing encounters unexpected input;
+        # fall back to the individual passes so one bad stage can't block the rest
+        with render_timings.stage('preprocess.fallback'):
+            for stage in (_convert_markdown_tables_to_grid, _normalize_grid_tables, _normalize_heading_adornments):
+                try:
+                    content = stage(content)
+                except Exception:
+                    pass
 
-    # Preprocess: normalize existing grid tables to avoid malformed widths
-    try:
-        content = _normalize_grid_tables(content)
-    except Exception:
-        pass
+    return content
 
-    # Preprocess: normalize heading adornments to match title lengths
-    try:
-        content = _normalize_heading_adornments(content)
-    except Exception:
-        pass
 
-    # Debug: write the final RST string that will be fed to docutils
+def _adjust_line_numbers(diagnostics: str, offset: int) -> str:
+    """
+    Shift 'path:line:' prefixes in docutils messages by `offset` lines so they
+    point into the original file (Jekyll strips YAML front matter before
+    handing content to the converter).
+    """
+    if not offset:
+        return diagnostics
+    return re.sub(r'^(.*?):(\d+):',
+                  lambda m: f'{m.group(1)}:{int(m.group(2)) + offset}:',
+                  diagnostics, flags=re.MULTILINE)
+
+
+def _settings_key(settings: dict) -> str:
+    """Stable text of a settings dict for cache keys (repr: json would be one more import per run)."""
+    return repr(sorted(settings.items()))
+
+
+def _dump_fragment(html: str, diagnostics: str, warnings: int) -> str:
+    """Fragment cache entry: a ``<warnings> <diagnostics length>`` line, the diagnostics, then the HTML."""
+    return f'{warnings} {len(diagnostics)}\n{diagnostics}{html}'
+
+
+def _load_fragment(entry: str) -> tuple:
+    """Inverse of `_dump_fragment`; raises ValueError for a malformed entry."""
+    header, _, body = entry.partition('\n')
+    warnings, size = map(int, header.split())
+    if size > len(body):
+        raise ValueError('truncated fragment cache entry')
+    return body[size:], body[:size], warnings
+
+
+def _toolchain() -> str:
+    """docutils and pygments versions plus a hash of this plugin's Python sources."""
+    global _toolchain_fingerprint
+    if _toolchain_fingerprint is None:
+        import docutils
+        import pygments
+        h = hashlib.sha256()
+        for name in sorted(os.listdir(_PLUGIN_DIR)):
+            if name.endswith('.py'):
+                with open(os.path.join(_PLUGIN_DIR, name), 'rb') as f:
+                    h.update(name.encode('utf-8') + b'\0' + f.read())
+        _toolchain_fingerprint = f'docutils {docutils.__version__}; pygments {pygments.__version__}; plugin {h.hexdigest()}'
+    return _toolchain_fingerprint
+
+
+def _config_stamps() -> list:
+    """
+    The docutils config files `Publisher.get_settings` reads, each with its
+    mtime. Read once per process, like the settings resolved from them.
+    """
+    global _config_file_stamps
+    if _config_file_stamps is None:
+        stamps = []
+        for path in DocutilsOptionParser.get_standard_config_files():
+            path = os.path.abspath(path)
+            try:
+                stamps.append(f'{path} {os.stat(path).st_mtime_ns}')
+            except OSError:
+                stamps.append(f'{path} -')
+        _config_file_stamps = stamps
+    return _config_file_stamps
+
+
+def _load_snapshot(writer=None, part=None) -> dict:
+    """
+    Load the command lines and resolved docutils settings recorded by earlier
+    one-shot rst2html.py runs, so a repeated command line is answered without
+    building docutils' option parser or the second one `Publisher.get_settings`
+    builds to read the config files. The snapshot is keyed by Python version,
+    writer, part, toolchain and config files, and is only kept while the
+    fragment cache is enabled. Returns it (empty when missing or stale) and
+    makes it current.
+    """
+    global _snapshot
+    key = None
+    if _fragment_cache.enabled:
+        key = DiskCache.digest(sys.version, f'{type(writer).__module__}.{type(writer).__name__}', str(part),
+                               _toolchain(), *_config_stamps())
+    _snapshot = {'key': key, 'store_options': None, 'options': {}, 'settings': {}, 'dirty': False}
+    if key:
+        try:
+            # marshal rather than pickle: it is built in, so loading costs no import
+            with open(os.path.join(_fragment_cache.directory, _SNAPSHOT_NAME), 'rb') as f:
+                data = marshal.load(f)
+            if data['key'] == key:
+                _snapshot.update(store_options=frozenset(data['store_options']), options=data['options'],
+                                 settings=data['settings'])
+        except Exception:
+            # Missing, stale or unreadable: rebuilt and saved by this run
+            pass
+    return _snapshot
+
+
+def _save_snapshot() -> None:
+    """Write the current snapshot back if this run added to it; failures are never fatal."""
+    if not (_snapshot and _snapshot['key'] and _snapshot['dirty']):
+        return
+    path = os.path.join(_fragment_cache.directory, _SNAPSHOT_NAME)
+    data = dict(_snapshot, store_options=sorted(_snapshot['store_options'] or ()))
+    del data['dirty']
     try:
-        with open('/tmp/last_rst_input.rst', 'w') as dbg:
-            dbg.write(content)
-    except Exception:
+        os.makedirs(_fragment_cache.directory, exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                marshal.dump(data, f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except (OSError, ValueError):
+        # ValueError: a setting marshal cannot store
         pass
 
+
+def _remember(entries: dict, key: str, value) -> None:
+    """Add `value` to a snapshot table, dropping its oldest entry when full."""
+    if len(entries) >= _SNAPSHOT_MAX_ENTRIES:
+        del entries[next(iter(entries))]
+    entries[key] = value
+    _snapshot['dirty'] = True
+
+
+def _split_command_line(argv: list, store_options) -> tuple:
+    """
+    Split `argv` into a signature of its options (without the per-document
+    --source-path), the source path and the positional arguments, or return
+    None unless every option is spelled out in full as `--name=value` for an
+    option that just stores its value: flags, abbreviations, callbacks such
+    as --config and the `-` and `--` arguments all need the real parser.
+    """
+    options, source_path, args = [], None, []
+    for arg in argv:
+        if not arg.startswith('-'):
+            args.append(arg)
+            continue
+        name, sep, value = arg.partition('=')
+        if not sep or name not in store_options:
+            return None
+        if name == '--source-path':
+            source_path = value
+        else:
+            options.append(arg)
+    return '\0'.join(options), source_path, args
+
+
+def _parse_command_line(writer, part, argv: list) -> tuple:
+    """
+    Parse rst2html.py's command line into `(opts, args)`, from the snapshot
+    when an earlier run recorded the same options and with the full option
+    parser (recording the result) otherwise.
+    """
+    snapshot = _load_snapshot(writer, part)
+    if snapshot['store_options'] is not None:
+        split = _split_command_line(argv, snapshot['store_options'])
+        cached = snapshot['options'].get(split[0]) if split else None
+        if cached is not None:
+            return OptionValues(dict(cached, source_path=split[1])), split[2]
+
+    p = _build_option_parser(writer, part)
+    opts, args = p.parse_args(argv)
+    if snapshot['key']:
+        if snapshot['store_options'] is None:
+            snapshot['store_options'] = frozenset(
+                name for option in p.option_list + [o for g in p.option_groups for o in g.option_list]
+                if option.action == 'store' for name in option._long_opts)
+            snapshot['dirty'] = True
+        split = _split_command_line(argv, snapshot['store_options'])
+        # Only record what the shortcut above would reproduce exactly
+        if split and split[1] == opts.source_path and split[2] == args:
+            _remember(snapshot['options'], split[0], dict(vars(opts), source_path=None))
+    return opts, args
+
+
+def _frozen_settings(settings: dict, writer=None):
+    """
+    Return the docutils settings object for `settings` overrides, resolved
+    once per process the way `publish_parts` resolves them on every call
+    (component defaults, config files, overrides), or taken from the
+    snapshot of an earlier run. Shared between documents: use
+    `_document_settings` to get a copy that may be modified.
+    """
+    # The source path is set per document by `_document_settings`
+    overrides = {name: value for name, value in settings.items() if name != 'source_path'}
+    key = (_settings_key(overrides), type(writer))
+    frozen = _settings_cache.get(key)
+    if frozen is None:
+        snapshot = _snapshot['settings'] if _snapshot and _snapshot['key'] else None
+        if snapshot is not None and key[0] in snapshot:
+            frozen = Values(snapshot[key[0]])
+        else:
+            # publish_parts propagates exceptions when used programmatically
+            overrides.setdefault('traceback', True)
+            # Component instances: docutils < 0.22 rejects names passed positionally
+            publisher = Publisher(standalone.Reader(), Parser(), writer or get_writer_class('pseudoxml')())
+            frozen = publisher.get_settings(**overrides)
+            if snapshot is not None:
+                _remember(snapshot, key[0], {name: value for name, value in vars(frozen).items()
+                                             if name != 'record_dependencies'})
+        _settings_cache[key] = frozen
+    return frozen
+
+
+def _document_settings(settings: dict, writer=None, source_path=None):
+    """Per-document copy of the frozen settings for `settings`."""
+    doc_settings = copy.copy(_frozen_settings(settings, writer))
+    # The only setting docutils mutates in place while publishing
+    doc_settings.record_dependencies = DependencyList()
+    if source_path:
+        doc_settings.source_path = source_path
+        doc_settings._source = source_path
+    return doc_settings
+
+
+class _CountingReader(standalone.Reader):
+    """
+    Standalone reader that counts the document's system messages of level
+    WARNING and above. They are counted as they are reported, so messages
+    below `report_level` (never printed, and filtered out of the doctree)
+    are included.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.warnings = 0
+
+    def new_document(self):
+        document = super().new_document()
+        document.reporter.attach_observer(self._observe)
+        return document
+
+    def _observe(self, message):
+        if message['level'] >= Reporter.WARNING_LEVEL:
+            self.warnings += 1
+
+
+def render(content: str, settings: dict, part: str, writer=None, source_path=None, stats=None):
+    """
+    Render one RST document and return ``(html, diagnostics)``.
+
+    `settings` are docutils setting overrides (see `_base_settings`); the dict
+    is copied, not mutated. `diagnostics` is the captured docutils stderr with
+    `<string>` replaced by `source_path` when one is given.
+
+    Results are served from `_fragment_cache` when the preprocessed source,
+    effective settings, part, writer and toolchain are all unchanged.
+    Stage timings are recorded when `render_timings` is enabled.
+
+    If `stats` is a dict, its ``warnings`` is set to the number of system
+    messages of level WARNING and above, whether or not `report_level` let
+    them through to `diagnostics`. When `html_compact` is enabled the HTML
+    is compacted last (cached fragments are stored uncompacted) and
+    ``bytes_saved`` is set too.
+    """
+    with render_timings.document(source_path) as timings:
+        html, diagnostics, warnings = _render(content, settings, part, writer, source_path, timings)
+        if stats is not None:
+            stats['warnings'] = warnings
+        if html_compact.enabled:
+            with render_timings.stage('compact'):
+                compacted = html_compact.compact(html)
+            saved = html_compact.bytes_saved(html, compacted)
+            html = compacted
+            if timings:
+                timings.bytes_saved = saved
+            if stats is not None:
+                stats['bytes_saved'] = saved
+        return html, diagnostics
+
+
+def _render(content, settings, part, writer, source_path, timings):
+    settings = dict(settings)
+
+    content = _preprocess(content)
+    if timings:
+        # The docutils input, dumped next to the profile
+        timings.preprocessed = content
+
     # Prefer MathJax rendering for LaTeX/math
     settings['math_output'] = 'MathJax https://cdn.jsdelivr.net/npm/mathjax@3/es5/tex-mml-chtml.js'
 
-    # Add source_path to settings for better error messages
-    if source_path:
-        settings['source_path'] = source_path
-        settings['_source'] = source_path
+    cache_key = None
+    if _fragment_cache.enabled:
+        cache_key = _fragment_cache.digest(
+            content,
+            _settings_key(settings),
+            str(source_path),
+            str(part),
+            f'{type(writer).__module__}.{type(writer).__name__}',
+            _toolchain(),
+            *_config_stamps(),
+        )
+        with render_timings.stage('cache.lookup'):
+            cached = _fragment_cache.get(cache_key)
+        if cached is not None:
+            try:
+                html, diagnostics, warnings = _load_fragment(cached)
+                if timings:
+                    timings.cached = True
+                return html, diagnostics, warnings
+            except ValueError:
+                pass
 
-    # Capture stderr to enhance error messages with filename
-    import io
-    from contextlib import redirect_stderr
+    # Add source_path to settings for better error messages
+    doc_settings = _document_settings(settings, writer, source_path)
 
+    # Capture stderr to enhance error messages with filename. Uncached code
+    # blocks are highlighted together afterwards, in parallel when worthwhile
     stderr_capture = io.StringIO()
-    with redirect_stderr(stderr_capture):
-        parts = publish_parts(
-            source=content,
-            source_path=source_path if source_path else '<string>',
-            settings_overrides=settings,
-            writer=writer,
-        )
+    reader = _CountingReader()
+    with redirect_stderr(stderr_capture), directives.deferred_highlighting(content) as deferred:
+        with render_timings.stage('publish_parts'):
+            parts = publish_parts(
+                source=content,
+                source_path=source_path if source_path else '<string>',
+                reader=reader,
+                settings=doc_settings,
+                writer=writer,
+            )
 
-    # Print captured stderr with filename context
     stderr_text = stderr_capture.getvalue()
-    if stderr_text:
-        # Replace <string> with actual filename if we have it
-        if source_path:
-            stderr_text = stderr_text.replace('<string>:', f'{source_path}:')
-        sys.stderr.write(stderr_text)
+    # Replace <string> with actual filename if we have it
+    if stderr_text and source_path:
+        stderr_text = stderr_text.replace('<string>:', f'{source_path}:')
 
-    if opts.part in parts:
-        html = parts[opts.part]
-        # Post-process to ensure headings within RST sections carry anchor ids
-        try:
-            html = _assign_section_ids_to_headings(html)
-        except Exception:
-            # Do not fail the build on post-processing; return the original fragment
-            pass
-        # Post-process to apply custom table width option
+    html = parts.get(part, '')
+    if deferred:
+        with render_timings.stage('highlight.deferred'):
+            html = deferred.resolve(html)
+    if cache_key:
+        with render_timings.stage('cache.store'):
+            _fragment_cache.put(cache_key, _dump_fragment(html, stderr_text, reader.warnings))
+    return html, stderr_text, reader.warnings
+
+
+def serve(settings: dict, part: str, writer=None, stdin=None, stdout=None):
+    """
+    Long-running worker loop: render documents until stdin is closed.
+
+    Each request is one JSON object per line::
+
+        {"source": "...", "source_path": "_posts/x.rst", "line_offset": 12,
+         "part": "fragment", "settings": {"initial_header_level": "2"}}
+
+    and each response is one JSON object per line::
+
+        {"html": "...", "diagnostics": "...", "error": null}
+
+    Responses also carry the document's ``warnings`` count (see `render`),
+    and ``bytes_saved`` with `html_compact` enabled.
+
+    Only `source` is required. Diagnostics have their line numbers shifted
+    by `line_offset`. A request that fails produces a response with `error`
+    set; the worker keeps serving.
+    """
+    import json
+    stdin = stdin or io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+    stdout = stdout or sys.stdout
+
+    # Load the common lexers before the first request, not during it
+    directives.prewarm()
+
+    for line in stdin:
+        if not line.strip():
+            continue
         try:
-            html = _apply_custom_table_width(html)
-        except Exception:
-            pass
-        # Post-process to transform mermaid blocks for Chirpy theme
+            request = json.loads(line)
+            doc_settings = dict(settings, **(request.get('settings') or {}))
+            stats = {}
+            html, diagnostics = render(
+                request['source'],
+                doc_settings,
+                request.get('part') or part,
+                writer=writer,
+                source_path=request.get('source_path'),
+                stats=stats,
+            )
+            response = dict({
+                'html': html,
+                'diagnostics': _adjust_line_numbers(diagnostics, int(request.get('line_offset') or 0)),
+                'error': None,
+            }, **stats)
+        except Exception as e:
+            response = {'html': '', 'diagnostics': '', 'error': f'{type(e).__name__}: {e}'}
+        stdout.write(json.dumps(response) + '\n')
+        stdout.flush()
+
+
+def _split_front_matter(text: str):
+    """
+    Strip Jekyll YAML front matter the way Jekyll does before calling the
+    converter. Returns ``(body, line_offset)`` where `line_offset` is the
+    number of lines removed.
+    """
+    if not text.startswith('---'):
+        return text, 0
+    lines = text.splitlines(True)
+    for idx, line in enumerate(lines[1:], start=1):
+        if line.strip() == '---':
+            return ''.join(lines[idx + 1:]), idx + 1
+    return text, 0
+
+
+def _batch_sources(paths: list) -> list:
+    """Expand directory arguments to their ``*.rst`` files, keeping file arguments as given."""
+    sources = []
+    for path in paths:
+        if os.path.isdir(path):
+            sources.extend(sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if name.endswith('.rst') and os.path.isfile(os.path.join(path, name))
+            ))
+        else:
+            sources.append(path)
+    return sources
+
+
+# Writer shared by the documents rendered in one batch worker process
+_batch_writer = None
+
+
+def _init_batch_worker(writer, highlight_jobs=None):
+    global _batch_writer
+    _batch_writer = writer
+    if highlight_jobs is not None:
+        directives.highlight_jobs = highlight_jobs
+
+
+def _render_batch_job(job: tuple) -> dict:
+    source_path, output_dir, name, settings, part = job
+    started = time.perf_counter()
+    hits = _fragment_cache.stats['hits']
+    entry = {'output': name + '.html', 'diagnostics': name + '.err'}
+    stats = {}
+    try:
+        with open(source_path, 'r', encoding='utf-8') as f:
+            body, line_offset = _split_front_matter(f.read())
+        html, diagnostics = render(body, settings, part, writer=_batch_writer, source_path=source_path,
+                                   stats=stats)
+        diagnostics = _adjust_line_numbers(diagnostics, line_offset)
+        entry['error'] = None
+    except Exception as e:
+        body, html, diagnostics = '', '', ''
+        entry['error'] = f'{type(e).__name__}: {e}'
+        stats['warnings'] = 0
+
+    # Same bytes rst2html.py prints for a single document
+    with open(os.path.join(output_dir, entry['output']), 'w', encoding='utf-8') as f:
+        f.write(html + '\n')
+    with open(os.path.join(output_dir, entry['diagnostics']), 'w', encoding='utf-8') as f:
+        f.write(diagnostics)
+
+    entry['source_sha256'] = hashlib.sha256(body.encode('utf-8')).hexdigest()
+    entry['seconds'] = round(time.perf_counter() - started, 4)
+    entry['cached'] = _fragment_cache.stats['hits'] > hits
+    entry.update(stats)
+    return entry
+
+
+def _document_fingerprint(source_path: str, settings: dict, part: str, writer=None) -> str:
+    """
+    Everything a batch output depends on: the whole source file (front matter
+    shifts diagnostic line numbers), the settings, part and writer, the
+    toolchain (docutils, pygments and this plugin's Python sources), the
+    docutils config files and whether the HTML is compacted.
+    """
+    with open(source_path, 'rb') as f:
+        source = f.read()
+    return DiskCache.digest(
+        source,
+        _settings_key(settings),
+        str(part),
+        f'{type(writer).__module__}.{type(writer).__name__}',
+        _toolchain(),
+        *_config_stamps(),
+        *(['compact'] if html_compact.enabled else []),
+    )
+
+
+def _load_manifest(output_dir: str) -> dict:
+    import json
+    try:
+        with open(os.path.join(output_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+            return json.load(f).get('documents') or {}
+    except (OSError, ValueError, AttributeError):
+        return {}
+
+
+def _is_fresh(entry, fingerprint: str, output_dir: str) -> bool:
+    """True if a previous manifest entry can be reused as is."""
+    return bool(
+        entry
+        and entry.get('fingerprint') == fingerprint
+        and entry.get('error') is None
+        and os.path.isfile(os.path.join(output_dir, entry['output']))
+        and os.path.isfile(os.path.join(output_dir, entry['diagnostics']))
+    )
+
+
+def render_batch(paths: list, output_dir: str, settings: dict, part: str, writer=None, jobs=None,
+                 incremental=False) -> dict:
+    """
+    Render many RST files in parallel and write ``<stem>.html``, ``<stem>.err``
+    and ``manifest.json`` into `output_dir`.
+
+    Front matter is stripped and diagnostic line numbers point into the
+    original file, as with the Jekyll converter. The manifest maps each source
+    path to its output files, the SHA-256 of the rendered body, a fingerprint
+    of everything the output depends on, render time and warning count
+    (and ``bytes_saved`` when `html_compact` is enabled). ``jobs=1``
+    renders serially in this process.
+
+    With `incremental`, documents whose fingerprint matches the existing
+    manifest keep their outputs and are marked ``skipped``; outputs of
+    documents no longer among the sources are removed.
+    """
+    started = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    previous = _load_manifest(output_dir) if incremental else {}
+
+    sources = _batch_sources(paths)
+    names = {}
+    for source_path in sources:
+        name = os.path.splitext(os.path.basename(source_path))[0]
+        if name in names:
+            raise ValueError(f'{source_path} and {names[name]} would both render to {name}.html')
+        names[name] = source_path
+
+    documents = {}
+    fingerprints = {}
+    job_list = []
+    for name, source_path in names.items():
+        fingerprints[source_path] = _document_fingerprint(source_path, settings, part, writer)
+        entry = previous.get(source_path)
+        if incremental and _is_fresh(entry, fingerprints[source_path], output_dir):
+            documents[source_path] = dict(entry, skipped=True)
+        else:
+            documents[source_path] = None
+            job_list.append((source_path, output_dir, name, settings, part))
+    jobs = jobs or os.cpu_count() or 1
+
+    # Forked batch workers inherit the loaded lexers
+    if job_list:
+        directives.prewarm()
+
+    if jobs == 1 or len(job_list) <= 1:
+        _init_batch_worker(writer)
+        results = [_render_batch_job(job) for job in job_list]
+    else:
+        # Imported here: it costs more start-up time than rendering a small post
+        from concurrent.futures import ProcessPoolExecutor
+        # Documents are already spread over the cores, so no nested highlight pools
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_batch_worker, initargs=(writer, 1)) as pool:
+            results = list(pool.map(_render_batch_job, job_list))
+
+    for job, entry in zip(job_list, results):
+        entry['fingerprint'] = fingerprints[job[0]]
+        entry['skipped'] = False
+        documents[job[0]] = entry
+
+    # Outputs of documents that were renamed or deleted since the last run
+    removed = [path for path in previous if path not in documents]
+    for path in removed:
+        for key in ('output', 'diagnostics'):
+            try:
+                os.unlink(os.path.join(output_dir, previous[path][key]))
+            except (OSError, KeyError, TypeError):
+                pass
+
+    manifest = {
+        'part': part,
+        'jobs': jobs,
+        'seconds': round(time.perf_counter() - started, 4),
+        'removed': removed,
+        'documents': documents,
+    }
+    import json
+    with open(os.path.join(output_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def transform(writer=None, part=None):
+    try:
+        return _transform(writer, part)
+    finally:
+        _save_snapshot()
+
+
+def _transform(writer, part):
+    opts, args = _parse_command_line(writer, part, sys.argv[1:])
+
+    settings = _base_settings(opts)
+    render_timings.configure(opts.timings, opts.profile_dir)
+    html_compact.configure(opts.compact)
+
+    if opts.worker:
+        serve(settings, opts.part, writer=writer)
+        return None
+
+    if opts.batch_output:
+        if not args:
+            parser = _build_option_parser(writer, part)
+            parser.error('--batch-output needs at least one file or directory')
+        manifest = render_batch(args, opts.batch_output, settings, opts.part, writer=writer, jobs=opts.jobs,
+                                incremental=opts.incremental)
+        documents = manifest['documents'].values()
+        failed = sum(1 for entry in documents if entry['error'])
+        warnings = sum(entry['warnings'] for entry in documents)
+        cached = sum(1 for entry in documents if entry['cached'] and not entry['skipped'])
+        skipped = [path for path, entry in manifest['documents'].items() if entry['skipped']]
+        rendered = len(manifest['documents']) - len(skipped)
+        sys.stderr.write(f"Rendered {rendered} documents in {manifest['seconds']:.2f}s "
+                         f"({manifest['jobs']} jobs, {len(skipped)} unchanged, {cached} cached, "
+                         f"{warnings} warnings, {failed} failed)\n")
+        if html_compact.enabled:
+            saved = sum(entry.get('bytes_saved', 0) for entry in documents)
+            sys.stderr.write(f'Compaction saved {saved / 1024:.1f} KiB\n')
+        if opts.incremental:
+            # Unchanged documents are flagged `skipped` in the manifest
+            for path, entry in manifest['documents'].items():
+                if not entry['skipped']:
+                    sys.stderr.write(f'  rendered: {path}\n')
+            for path in manifest['removed']:
+                sys.stderr.write(f'  removed:  {path}\n')
+        return None
+
+    # Track source file for better error messages
+    source_path = opts.source_path
+    if len(args) == 1:
         try:
-            html = _transform_mermaid_blocks(html)
-        except Exception:
-            pass
-        return html
-    return ''
+            content = open(args[0], 'r').read()
+            if not source_path:
+                source_path = args[0]
+        except IOError:
+            content = args[0]
+    else:
+        content = sys.stdin.read()
+
+    html, stderr_text = render(content, settings, opts.part, writer=writer, source_path=source_path)
+
+    # Print captured stderr with filename context
+    if stderr_text:
+        sys.stderr.write(stderr_text)
+
+    return html
@@ -18,6 +18,10 @@
       isGalleryMode: false,
     },
     referencesFetchInProgress: false,
+    // Whether window.attachmentReferences lists every attachment (injected
+    // by Jekyll or fetched whole), and the files whose shard was fetched
+    referencesInline: null,
+    referencesFetched: {},
   };
 
   // Configuration
@@ -804,8 +808,12 @@
       return attemptFetchReferences(panel, filename);
     }
 
-    if (Object.keys(references).length === 0) {
-      console.warn('References data is empty - attempting lazy fetch');
+    if (state.referencesInline === null) {
+      state.referencesInline = Object.keys(references).length > 0;
+    }
+
+    if (!fileRefs && !state.referencesInline && !state.referencesFetched[filename]) {
+      console.warn('References for ' + filename + ' not loaded - attempting lazy fetch');
       return attemptFetchReferences(panel, filename);
     }
 
@@ -899,32 +907,77 @@
     }
 
     // Use the same baseurl detection logic
-    var baseurl = getBaseurl();
-    var url = baseurl + '/attachments-data/attachment_references.json';
-
-    fetch(url, { cache: 'no-store' })
-      .then(function (res) {
-        if (!res.ok) throw new Error('HTTP ' + res.status);
-        return res.json();
+    var dataUrl = getBaseurl() + '/attachments-data/';
+
+    // The index is small and revalidated; it names the shard holding this
+    // file, which is fetched from the HTTP cache when unchanged (shard names
+    // change with their contents)
+    var complete = false;
+    fetchJson(dataUrl + 'index.json', 'no-cache')
+      .then(function (index) {
+        var shards = index && index.references && index.references.shards;
+        if (!shards || !shards.length) {
+          throw new Error('index.json lists no reference shards');
+        }
+        return fetchJson(
+          dataUrl + shards[referenceBucket(filename, shards.length)],
+          'default'
+        );
+      })
+      .catch(function (err) {
+        // Sites deployed without the index or shards still have the full file
+        console.warn('Reference shard unavailable (' + err.message + '); fetching all references');
+        return fetchJson(dataUrl + 'attachment_references.json', 'no-cache').then(
+          function (json) {
+            complete = true;
+            return json;
+          }
+        );
       })
       .then(function (json) {
         if (json && typeof json === 'object') {
-          window.attachmentReferences = json;
+          if (complete) state.referencesInline = true;
+          var references = window.attachmentReferences || {};
+          Object.keys(json).forEach(function (name) {
+            references[name] = json[name];
+          });
+          window.attachmentReferences = references;
         } else {
           console.warn('Fetched references were not an object');
-          window.attachmentReferences = {};
         }
       })
       .catch(function (err) {
         console.error('Failed to fetch attachment references:', err);
       })
       .finally(function () {
+        state.referencesFetched[filename] = true;
         state.referencesFetchInProgress = false;
         // Re-render panel with whatever we have now
         loadReferences(panel, filename);
       });
   }
 
+  function fetchJson(url, cacheMode) {
+    return fetch(url, { cache: cacheMode }).then(function (res) {
+      if (!res.ok) throw new Error('HTTP ' + res.status);
+      return res.json();
+    });
+  }
+
+  /**
+   * Shard holding a file's references: 32-bit FNV-1a of the UTF-8 filename
+   * modulo the shard count (as reference_bucket() in
+   * scripts/generate_attachment_data.py)
+   */
+  function referenceBucket(filename, buckets) {
+    var bytes = unescape(encodeURIComponent(filename));
+    var hash = 0x811c9dc5;
+    for (var i = 0; i < bytes.length; i++) {
+      hash = Math.imul(hash ^ bytes.charCodeAt(i), 0x01000193) >>> 0;
+    }
+    return hash % buckets;
+  }
+
   function updateReferencesPanel(panel, filename) {
     loadReferences(panel, filename);
   }
@@ -0,0 +1,207 @@
+"""
+Derived media for the attachment gallery, used by generate_attachment_data.py.
+
+Every image gets downscaled copies at RESPONSIVE_WIDTHS (the smallest is
+the gallery thumbnail). They are written to one directory and named after
+the source's content hash and width, so an image is only processed once:
+unchanged files, renamed files and identical copies under another path
+all reuse the same outputs.
+
+Every PDF gets its page count and title (with pypdf) and a preview of
+its first page (rendered with poppler's pdftoppm), cached the same way.
+
+All of these are optional. Without Pillow no image variants are written
+and gallery items keep pointing at the originals; without pypdf or
+pdftoppm the PDF fields they provide are left out. Previews are WebP when
+Pillow is available and PNG otherwise.
+"""
+
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:
+    Image = ImageOps = features = None
+
+try:
+    from pypdf import PdfReader
+    # Damaged PDFs are reported once by the generator, not warned about line by line
+    logging.getLogger('pypdf').setLevel(logging.ERROR)
+except ImportError:
+    PdfReader = None
+
+# Widths (px) of the downscaled copies; only those narrower than the original are written
+RESPONSIVE_WIDTHS = (320, 640, 1280)
+
+# Copies are WebP when Pillow can write it (a fraction of the size of PNG
+# screenshots); otherwise source extension -> (Pillow format, output
+# extension), with GIFs as PNG stills
+_WEBP = ('WEBP', '.webp')
+_FORMATS = {
+    '.jpg': ('JPEG', '.jpg'),
+    '.jpeg': ('JPEG', '.jpg'),
+    '.png': ('PNG', '.png'),
+    '.webp': ('WEBP', '.webp'),
+    '.gif': ('PNG', '.png'),
+}
+_SAVE_OPTIONS = {
+    'JPEG': {'quality': 82, 'optimize': True, 'progressive': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': 80, 'method': 4},
+}
+
+# Whether Pillow can write WebP (checked on first use)
+_webp = None
+
+# Width (px) of first-page previews, and the longest a render may take
+PDF_PREVIEW_WIDTH = 480
+PDF_RENDER_TIMEOUT = 60
+
+_MEDIA_NAME = re.compile(r'[0-9a-f]{24}-(?:([0-9]+w)|page1)\.(?:jpg|png|webp)')
+
+# EXIF orientations that swap width and height
+_ROTATED = (5, 6, 7, 8)
+
+
+def images_available() -> bool:
+    return Image is not None
+
+
+def is_image(ext: str) -> bool:
+    return ext.lower() in _FORMATS
+
+
+def _output_format(ext: str) -> tuple:
+    global _webp
+    if _webp is None:
+        _webp = bool(features and features.check('webp'))
+    return _WEBP if _webp else _FORMATS[ext.lower()]
+
+
+def variant_name(digest: str, width: int, ext: str) -> str:
+    """File name of the `width` px copy of the image with SHA-256 `digest`"""
+    return f"{digest[:24]}-{width}w{_output_format(ext)[1]}"
+
+
+def media_kind(name: str):
+    """'image' for an image copy, 'pdf' for a PDF preview, None for any other file name"""
+    match = _MEDIA_NAME.fullmatch(name)
+    if match is None:
+        return None
+    return 'image' if match.group(1) else 'pdf'
+
+
+def image_variants(job: tuple) -> dict:
+    """
+    Write the missing downscaled copies of one image.
+
+    `job` is (source_path, digest, ext, output_dir). Returns the intrinsic
+    size as displayed (EXIF orientation applied) and the widths written,
+    as {'width', 'height', 'widths'}, or {'error': message}. When every
+    copy already exists only the image header is read.
+    """
+    source_path, digest, ext, output_dir = job
+    try:
+        with Image.open(source_path) as image:
+            width, height = image.size
+            if image.getexif().get(0x0112, 1) in _ROTATED:
+                width, height = height, width
+            widths = [w for w in RESPONSIVE_WIDTHS if w < width]
+            missing = [w for w in widths
+                       if not os.path.exists(os.path.join(output_dir, variant_name(digest, w, ext)))]
+            if missing:
+                _write_variants(image, digest, ext, output_dir, missing)
+    except Exception as e:
+        return {'error': f'{type(e).__name__}: {e}'}
+    return {'width': width, 'height': height, 'widths': widths}
+
+
+def _write_variants(image, digest: str, ext: str, output_dir: str, widths: list) -> None:
+    fmt = _output_format(ext)[0]
+    image = ImageOps.exif_transpose(image)
+    # Palette and other modes would be resampled nearest-neighbour (or cannot be saved)
+    modes = {'JPEG': ('RGB', 'L'), 'PNG': ('RGB', 'RGBA', 'L', 'LA'), 'WEBP': ('RGB', 'RGBA')}[fmt]
+    if image.mode not in modes:
+        alpha = 'A' in image.mode or 'transparency' in image.info
+        image = image.convert('RGBA' if alpha and 'RGBA' in modes else 'RGB')
+
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        path = os.path.join(output_dir, variant_name(digest, width, ext))
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        image.resize((width, height), Image.LANCZOS).save(temp_path, fmt, **_SAVE_OPTIONS[fmt])
+        os.replace(temp_path, path)
+
+
+def pdf_tools() -> list:
+    """Names of the available PDF tools (empty when no PDF fields can be produced)"""
+    tools = []
+    if PdfReader is not None:
+        tools.append('pypdf')
+    if shutil.which('pdftoppm'):
+        tools.append('pdftoppm')
+    return tools
+
+
+def preview_name(digest: str) -> str:
+    """File name of the first-page preview of the PDF with SHA-256 `digest`"""
+    return f"{digest[:24]}-page1{_output_format('.png')[1]}"
+
+
+def pdf_details(job: tuple) -> dict:
+    """
+    Page count, title and first-page preview of one PDF.
+
+    `job` is (source_path, digest, output_dir). Returns {'pages', 'title',
+    'preview'}, each None when unavailable (no pypdf, no title in the
+    document info, no pdftoppm), or {'error': message} when the file
+    cannot be read as a PDF at all. An existing preview is not rendered
+    again.
+    """
+    source_path, digest, output_dir = job
+    details = {'pages': None, 'title': None, 'preview': None}
+    try:
+        if PdfReader is not None:
+            reader = PdfReader(source_path)
+            if reader.is_encrypted:
+                # Most "encrypted" papers only restrict editing; an empty password opens them
+                reader.decrypt('')
+            details['pages'] = len(reader.pages)
+            title = reader.metadata.title if reader.metadata else None
+            if isinstance(title, str) and title.strip():
+                details['title'] = ' '.join(title.split())
+
+        pdftoppm = shutil.which('pdftoppm')
+        if pdftoppm:
+            name = preview_name(digest)
+            path = os.path.join(output_dir, name)
+            if not os.path.exists(path):
+                _render_first_page(pdftoppm, source_path, path)
+            details['preview'] = name
+    except Exception as e:
+        return {'error': f'{type(e).__name__}: {e}'}
+    return details
+
+
+def _render_first_page(pdftoppm: str, source_path: str, path: str) -> None:
+    with tempfile.TemporaryDirectory() as temp_dir:
+        prefix = os.path.join(temp_dir, 'page')
+        subprocess.run(
+            [pdftoppm, '-f', '1', '-l', '1', '-singlefile', '-png',
+             '-scale-to-x', str(PDF_PREVIEW_WIDTH), '-scale-to-y', '-1', source_path, prefix],
+            check=True, capture_output=True, timeout=PDF_RENDER_TIMEOUT,
+        )
+        rendered = prefix + '.png'
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        fmt = _output_format('.png')[0]
+        if fmt == 'PNG':
+            shutil.copyfile(rendered, temp_path)
+        else:
+            with Image.open(rendered) as image:
+                image.convert('RGB').save(temp_path, fmt, **_SAVE_OPTIONS[fmt])
+        os.replace(temp_path, path)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark the line-numbered code table built for `code-block` directives.
+
+Highlights a synthetic Python listing of each requested size once, then
+times `directives._code_table` against the regex-and-concatenation builder
+it replaced. Both must produce identical tables; time per line should stay
+flat as the block grows.
+
+Usage:
+  python3 scripts/bench_code_table.py [--lines N [N ...]] [--repeat N]
+"""
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / '_plugins' / 'jekyll-rst'))
+
+from pygments import highlight  # noqa: E402
+from pygments.formatters import HtmlFormatter  # noqa: E402
+from pygments.lexers import PythonLexer  # noqa: E402
+
+import directives  # noqa: E402
+
+
+def make_listing(lines: int) -> str:
+    """Python source with a mix of keywords, strings, comments and blank lines."""
+    out = []
+    for n in range(lines):
+        if n % 10 == 0:
+            out.append(f'def step_{n}(value, *, scale=2):')
+        elif n % 10 == 9:
+            out.append('')
+        elif n % 3 == 0:
+            out.append(f'    # adjust <value> & keep "{n}" in range')
+        else:
+            out.append(f"    value = value * scale + {n}  # '{n % 7}'")
+    return '\n'.join(out)
+
+
+def concatenating_table(lexer_name: str, parsed: str) -> str:
+    """The previous builder: DOTALL regex over the wrapped output, then `+=` per line."""
+    stripped = re.compile(r"<pre>(.+)</pre>", re.S).search(parsed).group(1)
+    table = '<div class="highlight"><table><tr><td class="gutter"><pre class="line-numbers">'
+    lined = ''
+    for idx, line in enumerate(stripped.splitlines(True)):
+        table += '<span class="line-number">%d</span>\n' % (idx + 1)
+        lined += '<span class="line">%s</span>' % line
+    table += '</pre></td><td class="code"><pre><code class="%s">%s</code></pre></td></tr></table></div>' % (lexer_name, lined)
+    return table
+
+
+def linear_table(lexer_name: str, parsed: str) -> str:
+    return directives._code_table(lexer_name, ('<span></span>' + parsed).splitlines(True))
+
+
+def best_of(func, args: tuple, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--lines', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    lexer = PythonLexer()
+    for lines in args.lines:
+        source = make_listing(lines)
+        started = time.perf_counter()
+        wrapped = highlight(source, lexer, HtmlFormatter())
+        highlight_seconds = time.perf_counter() - started
+        bare = highlight(source, lexer, HtmlFormatter(nowrap=True))
+
+        if concatenating_table('python', wrapped) != linear_table('python', bare):
+            print(f'Error: tables differ for {lines} lines', file=sys.stderr)
+            return 1
+
+        old = best_of(concatenating_table, ('python', wrapped), args.repeat)
+        new = best_of(linear_table, ('python', bare), args.repeat)
+        print(f'{lines} lines ({len(bare) / 1024:.0f} KiB highlighted, highlight {highlight_seconds * 1000:.0f} ms)')
+        print(f'  regex + concatenation: {old * 1000:8.1f} ms  ({old / lines * 1e6:.2f} us/line)')
+        print(f'  linear builder:        {new * 1000:8.1f} ms  ({new / lines * 1e6:.2f} us/line, {old / new:.2f}x)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark the RST preprocessing that runs before docutils.
+
+Generates a large, table-heavy synthetic post and times the single-pass
+engine (`transform._preprocess_rst`) against the three separate string
+passes it replaced. Both must produce identical output. Then times single
+large tables (Markdown, already-normalized grid and ragged grid) of each
+`--table-rows` size; time per row should stay flat as tables grow.
+
+Usage:
+  python3 scripts/bench_rst_preprocess.py [--sections N] [--rows N] [--repeat N]
+                                          [--table-rows N [N ...]] [--columns N]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / '_plugins' / 'jekyll-rst'))
+
+import transform  # noqa: E402
+
+
+def make_document(sections: int, rows: int) -> str:
+    """Build a post mixing headings, prose, Markdown pipe tables and ragged grid tables."""
+    out = []
+    for s in range(sections):
+        title = f'Section {s}: tables and notes'
+        out += [title, '-' * (len(title) - 3), '']
+        out += ['Some prose describing the table below, long enough to look real.', '']
+
+        # Markdown pipe table
+        out.append('| Name | Value | Description |')
+        out.append('| --- | :---: | --- |')
+        for r in range(rows):
+            out.append(f'| item-{r} | {r * 17} | row {r} of section {s} |')
+        out.append('')
+
+        # Grid table with inconsistent widths
+        out.append('+------+-------+')
+        out.append('| Key  | Value |')
+        out.append('+======+=======+')
+        for r in range(rows):
+            out.append(f'| k{r} | {"v" * (r % 13)} |')
+            out.append('+------+-------+')
+        out.append('')
+
+        sub = f'Subsection {s}'
+        out += ['~' * (len(sub) + 4), sub, '~' * (len(sub) + 4), '']
+    return '\n'.join(out) + '\n'
+
+
+def make_tables(rows: int, columns: int) -> dict:
+    """One table of each kind the table stage handles, `rows` x `columns`."""
+    header = '|' + '|'.join(f' column {c} ' for c in range(columns)) + '|'
+    body = ['|' + '|'.join(f' r{r}c{c} {"x" * ((r * c) % 7)} ' for c in range(columns)) + '|' for r in range(rows)]
+    markdown = '\n'.join([header, '|' + ' --- |' * columns] + body)
+    grid = transform._convert_markdown_tables_to_grid(markdown)
+    # Every fifth row one character too wide
+    ragged = '\n'.join(line + ' |' if n % 10 == 3 else line for n, line in enumerate(grid.splitlines()))
+    return {'markdown': markdown, 'normalized grid': grid, 'ragged grid': ragged}
+
+
+def three_passes(text: str) -> str:
+    text = transform._convert_markdown_tables_to_grid(text)
+    text = transform._normalize_grid_tables(text)
+    return transform._normalize_heading_adornments(text)
+
+
+def best_of(func, text: str, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sections', type=int, default=40)
+    parser.add_argument('--rows', type=int, default=250)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--table-rows', type=int, nargs='+', default=[1_000, 10_000])
+    parser.add_argument('--columns', type=int, default=6)
+    args = parser.parse_args()
+
+    text = make_document(args.sections, args.rows)
+    if three_passes(text) != transform._preprocess_rst(text):
+        print('Error: single-pass output differs from the three-pass chain', file=sys.stderr)
+        return 1
+
+    print(f"Document: {len(text.splitlines())} lines, {len(text) / 1024:.0f} KiB")
+    chained = best_of(three_passes, text, args.repeat)
+    fused = best_of(transform._preprocess_rst, text, args.repeat)
+    print(f"  three passes: {chained * 1000:8.1f} ms")
+    print(f"  single pass:  {fused * 1000:8.1f} ms  ({chained / fused:.2f}x)")
+
+    for rows in args.table_rows:
+        print(f"\nOne table, {rows} rows x {args.columns} columns:")
+        for kind, table in make_tables(rows, args.columns).items():
+            if three_passes(table) != transform._preprocess_rst(table):
+                print(f'Error: single-pass output differs for the {kind} table', file=sys.stderr)
+                return 1
+            chained = best_of(three_passes, table, args.repeat)
+            fused = best_of(transform._preprocess_rst, table, args.repeat)
+            print(f"  {kind:16} three passes {chained * 1000:8.1f} ms, single pass {fused * 1000:8.1f} ms "
+                  f"({fused / rows * 1e6:.2f} us/row, {chained / fused:.2f}x)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Benchmark rst2html.py start-up against a baseline revision and an import budget.
+
+Exports `_plugins/jekyll-rst` at a git revision (default: HEAD) and renders
+a tiny post with both that entry point and the working tree's, interleaved,
+reporting the median wall and CPU time of each. Every run renders a slightly
+different post, so the fragment cache misses while the settings snapshot it
+keeps next to it is used, as when Jekyll converts one post per process.
+
+Both trees are byte-compiled first, so neither pays for compiling the
+plugin's sources on every run (as it would with PYTHONDONTWRITEBYTECODE
+set and stale or missing .pyc files). The fastest of --repeat
+`python3 -X importtime` runs of the working tree also gives the total
+import time and the most expensive imports.
+
+Exits non-zero when the working tree's median CPU time is more than
+--tolerance-ms above the baseline's, when the import total exceeds the
+budget, or when a module that should only load on demand (e.g. the process
+pool used by --batch-output) is imported while rendering a single document.
+
+Usage:
+  python3 scripts/bench_rst_startup.py [--baseline REV | --no-baseline] [--repeat N]
+                                       [--tolerance-ms MS] [--budget-ms MS] [--top N] [--json]
+"""
+
+import argparse
+import compileall
+import io
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+PLUGIN_DIR = '_plugins/jekyll-rst'
+RST2HTML = REPO_ROOT / PLUGIN_DIR / 'rst2html.py'
+
+# Only needed by --batch-output; must not be paid for by every Jekyll conversion
+LAZY_MODULES = ['concurrent.futures.process', 'multiprocessing']
+
+TINY_POST = """\
+Start-up benchmark
+==================
+
+A short paragraph with *emphasis* and a `link <https://example.com>`_.
+
+.. run {run}
+"""
+
+
+def parse_importtime(stderr: str) -> list:
+    """Return ``(module, self_us, cumulative_us, depth)`` for each `-X importtime` line."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def export_revision(revision: str, target: str) -> Path:
+    """Extract the plugin directory at `revision` into `target` and return its rst2html.py."""
+    proc = subprocess.run(['git', 'archive', '--format=tar', revision, PLUGIN_DIR],
+                          cwd=REPO_ROOT, capture_output=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"git archive {revision}: {proc.stderr.decode(errors='replace').strip()}")
+    with tarfile.open(fileobj=io.BytesIO(proc.stdout)) as archive:
+        archive.extractall(target)
+    return Path(target) / PLUGIN_DIR / 'rst2html.py'
+
+
+def run_once(rst2html: Path, work_dir: str, run: int, env: dict, importtime=False) -> tuple:
+    """Render the tiny post once; returns (wall seconds, CPU seconds, stderr)."""
+    source_path = os.path.join(work_dir, f'post-{run}.rst')
+    with open(source_path, 'w', encoding='utf-8') as f:
+        f.write(TINY_POST.format(run=run))
+    command = [sys.executable, *(['-X', 'importtime'] if importtime else []), str(rst2html),
+               '--part=fragment', '--initial-header-level=2', f'--source-path={source_path}', source_path]
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    started = time.perf_counter()
+    proc = subprocess.run(command, capture_output=True, text=True, env=env, cwd=work_dir)
+    wall = time.perf_counter() - started
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    os.unlink(source_path)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f'{rst2html} failed')
+    cpu = (after.ru_utime + after.ru_stime) - (before.ru_utime + before.ru_stime)
+    return wall, cpu, proc.stderr
+
+
+def summarise(runs: list) -> dict:
+    return {
+        'wall_ms': round(statistics.median(wall for wall, _ in runs) * 1000, 1),
+        'cpu_ms': round(statistics.median(cpu for _, cpu in runs) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--baseline', default='HEAD', metavar='REV',
+                        help='Git revision whose rst2html.py to compare against (default: HEAD)')
+    parser.add_argument('--no-baseline', action='store_true', help='Only time the working tree')
+    parser.add_argument('--repeat', type=int, default=15)
+    parser.add_argument('--tolerance-ms', type=float, default=10.0,
+                        help='Allowed median CPU time above the baseline (default: 10)')
+    parser.add_argument('--budget-ms', type=float, default=250.0,
+                        help='Maximum total import time of the fastest run (default: 250)')
+    parser.add_argument('--top', type=int, default=12)
+    parser.add_argument('--json', action='store_true', help='Print machine-readable results')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='rst-startup-') as temp_dir:
+        work_dir = os.path.join(temp_dir, 'work')
+        os.mkdir(work_dir)
+        # The fragment cache stays enabled (the settings snapshot lives in it)
+        env = dict(os.environ, JEKYLL_RST_CACHE_DIR=os.path.join(temp_dir, 'rst-cache'),
+                   JEKYLL_RST_PYGMENTS_CACHE_DIR=os.path.join(temp_dir, 'pygments-cache'))
+        entries = {'current': RST2HTML}
+        try:
+            if not args.no_baseline:
+                entries['baseline'] = export_revision(args.baseline, os.path.join(temp_dir, 'baseline'))
+            # Warm up: fills the snapshot and the OS file cache for both trees
+            for name, rst2html in entries.items():
+                compileall.compile_dir(str(rst2html.parent), maxlevels=0, quiet=1)
+                run_once(rst2html, work_dir, -1, env)
+            timings = {name: [] for name in entries}
+            for run in range(args.repeat):
+                for name, rst2html in entries.items():
+                    wall, cpu, _ = run_once(rst2html, work_dir, run, env)
+                    timings[name].append((wall, cpu))
+            profiled = [run_once(RST2HTML, work_dir, args.repeat + run, env, importtime=True)
+                        for run in range(args.repeat)]
+        except RuntimeError as e:
+            print(f'Error: {e}', file=sys.stderr)
+            return 2
+
+    results = {name: summarise(runs) for name, runs in timings.items()}
+    _, _, stderr = min(profiled, key=lambda run: run[0])
+    rows = parse_importtime(stderr)
+    import_ms = sum(cumulative for _, _, cumulative, depth in rows if depth == 0) / 1000
+    imported = {name for name, _, _, _ in rows}
+    eager = [name for name in LAZY_MODULES if name in imported]
+    top_level = sorted((row for row in rows if row[3] == 0), key=lambda row: -row[2])[:args.top]
+    by_self = sorted(rows, key=lambda row: -row[1])[:args.top]
+    delta_ms = results['current']['cpu_ms'] - results['baseline']['cpu_ms'] if 'baseline' in results else None
+
+    if args.json:
+        print(json.dumps({
+            'baseline_revision': None if args.no_baseline else args.baseline,
+            'runs': args.repeat,
+            'results': results,
+            'cpu_delta_ms': None if delta_ms is None else round(delta_ms, 1),
+            'import_ms': round(import_ms, 1),
+            'budget_ms': args.budget_ms,
+            'modules': len(rows),
+            'eager_lazy_modules': eager,
+            'top_level': {name: round(cumulative / 1000, 1) for name, _, cumulative, _ in top_level},
+            'self': {name: round(self_us / 1000, 1) for name, self_us, _, _ in by_self},
+        }, indent=2))
+    else:
+        print(f'Median of {args.repeat} runs:')
+        for name, result in results.items():
+            label = f'{name} ({args.baseline})' if name == 'baseline' else name
+            print(f"  {label:28} {result['wall_ms']:7.1f} ms wall {result['cpu_ms']:7.1f} ms CPU")
+        if delta_ms is not None:
+            print(f'  CPU time vs baseline: {delta_ms:+.1f} ms (tolerance {args.tolerance_ms:.0f} ms)')
+        print(f"Imports (fastest -X importtime run): {import_ms:.0f} ms importing {len(rows)} modules "
+              f"(budget {args.budget_ms:.0f} ms)")
+        print('  Top-level imports (cumulative):')
+        for name, _, cumulative, _ in top_level:
+            print(f'    {cumulative / 1000:7.1f} ms  {name}')
+        print('  Slowest modules (self):')
+        for name, self_us, _, _ in by_self:
+            print(f'    {self_us / 1000:7.1f} ms  {name}')
+
+    status = 0
+    if delta_ms is not None and delta_ms > args.tolerance_ms:
+        print(f'Error: {delta_ms:.1f} ms more CPU time per run than {args.baseline}', file=sys.stderr)
+        status = 1
+    if eager:
+        print(f"Error: imported on start-up but only needed on demand: {', '.join(eager)}", file=sys.stderr)
+        status = 1
+    if import_ms > args.budget_ms:
+        print(f'Error: import time {import_ms:.0f} ms exceeds the {args.budget_ms:.0f} ms budget', file=sys.stderr)
+        status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Benchmark the RST and attachment pipelines on a synthetic site.
+
+Generates a corpus of N posts (Markdown pipe tables, ragged grid tables,
+short heading adornments, code blocks in several languages, Mermaid diagrams
+and attachment references) plus M attachment files (valid PNG images and
+PDFs, so the media steps read real files), then times:
+
+  - transform.render() for every post, and directives.Pygments inside it
+  - each RST preprocessor, and the single-pass preprocessor
+  - AttachmentDataGenerator.generate()
+  - format_rst.main()
+
+Render and highlight caches are disabled so every run does the full work.
+Results are written as JSON and can be compared with an earlier run.
+
+Usage:
+  python3 scripts/bench_suite.py [--posts N] [--attachments M] [--sections N]
+                                 [--repeat N] [--output results.json]
+                                 [--compare baseline.json] [--keep-corpus DIR]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+REPO_ROOT = SCRIPTS_DIR.parent
+sys.path.insert(0, str(REPO_ROOT / '_plugins' / 'jekyll-rst'))
+sys.path.insert(0, str(SCRIPTS_DIR))
+
+import docutils  # noqa: E402
+import pygments  # noqa: E402
+
+import transform  # noqa: E402
+import directives  # noqa: E402
+import format_rst  # noqa: E402
+from generate_attachment_data import AttachmentDataGenerator  # noqa: E402
+
+# Code block bodies by language; {n} varies the content between blocks
+CODE_SAMPLES = {
+    'python': ['def handler_{n}(event, context=None):',
+               '    """Process one event."""',
+               '    values = [x * {n} for x in event.get("values", [])]',
+               '    return {{"total": sum(values), "count": len(values)}}  # result'],
+    'bash': ['#!/usr/bin/env bash',
+             'set -euo pipefail',
+             'for f in build/*.log; do grep -c "ERROR {n}" "$f" || true; done',
+             'echo "done: $((1 + {n}))"'],
+    'yaml': ['service_{n}:', '  image: "example/app:{n}"', '  ports: ["80{n}:80"]', '  restart: unless-stopped'],
+    'json': ['{{', '  "id": {n},', '  "tags": ["bench", "synthetic"],', '  "enabled": true', '}}'],
+    'sql': ['SELECT p.id, COUNT(*) AS hits', 'FROM posts p JOIN views v ON v.post_id = p.id',
+            'WHERE p.id > {n}', 'GROUP BY p.id ORDER BY hits DESC;'],
+    'javascript': ['export async function load{n}(url) {{', '  const res = await fetch(url);',
+                   '  return (await res.json()).items.filter(i => i.id > {n});', '}}'],
+}
+
+# Images are all PNG: the corpus is written with the standard library, which has no JPEG encoder
+ATTACHMENT_KINDS = [('images', '.png'), ('images', '.png'), ('articles', '.pdf'), ('research_papers', '.pdf')]
+
+
+def make_png(rng: random.Random) -> bytes:
+    """A valid RGB PNG of random noise, 16-96 px a side (roughly 1-27 KB)."""
+    width, height = rng.randint(16, 96), rng.randint(16, 96)
+    raw = b''.join(b'\0' + rng.randbytes(width * 3) for _ in range(height))
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw)) + chunk(b'IEND', b''))
+
+
+def make_pdf(rng: random.Random, title: str) -> bytes:
+    """A valid PDF of 1-3 text pages with a document title."""
+    pages = rng.randint(1, 3)
+    objects = [b'<< /Type /Catalog /Pages 2 0 R >>',
+               b'<< /Type /Pages /Kids [' + b' '.join(b'%d 0 R' % (4 + 2 * p) for p in range(pages))
+               + b'] /Count %d >>' % pages,
+               b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    for p in range(pages):
+        lines = [f'({title}, page {p + 1}, line {n}: {rng.randbytes(24).hex()}) Tj 0 -14 Td'
+                 for n in range(rng.randint(10, 50))]
+        stream = ('BT /F1 10 Tf 40 800 Td ' + ' '.join(lines) + ' ET').encode('ascii')
+        objects.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+                       b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % (5 + 2 * p))
+        objects.append(b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream')
+    objects.append(b'<< /Title (' + title.encode('ascii') + b') >>')
+
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    out += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    out += b'trailer\n<< /Size %d /Root 1 0 R /Info %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (
+        len(objects) + 1, len(objects), xref)
+    return bytes(out)
+
+
+def make_post(index: int, sections: int, rows: int, code_lines: int, attachments: list) -> str:
+    """One RST post exercising every preprocessing stage and the code-block directive."""
+    slug = f'synthetic-post-{index}'
+    title = f'Synthetic post {index}: tables, code and diagrams'
+    out = ['---', 'layout: post', f'title: "{title}"', f'date: 2025-01-{index % 28 + 1:02d} 00:00:00 +0000',
+           'categories: [bench]', 'tags: [synthetic, benchmark]', '---', '',
+           title, '=' * (len(title) - 5), '']
+    out += [f'Post {index} walks through a synthetic topic with enough prose to look like a real article. '
+            'It mentions *emphasis*, ``inline code`` and a `link <https://example.com>`_.', '']
+
+    languages = list(CODE_SAMPLES)
+    for s in range(sections):
+        heading = f'Section {s} of {slug}'
+        out += [heading, '-' * (len(heading) + 2), '']
+        out += ['Some explanatory prose for this section, followed by a table, a listing and notes.', '']
+
+        out += ['| Name | Value | Description |', '| --- | :---: | --- |']
+        out += [f'| item-{r} | {r * 7} | row {r} of section {s} |' for r in range(rows)]
+        out.append('')
+
+        out += ['+------+-------+', '| Key  | Value |', '+======+=======+']
+        for r in range(rows):
+            out += [f'| k{r} | {"v" * (r % 9 + 1)} |', '+------+-------+']
+        out.append('')
+
+        language = languages[(index + s) % len(languages)]
+        sample = CODE_SAMPLES[language]
+        out += [f'.. code-block:: {language}', '   :caption: Listing', '']
+        out += ['   ' + sample[k % len(sample)].format(n=index * 100 + s + k // len(sample))
+                for k in range(code_lines)]
+        out.append('')
+
+        if s % 3 == 2:
+            out += ['.. code-block:: mermaid', '', '   flowchart TD',
+                    f'       A[Post {index}] --> B{{Section {s}}}', '       B --> C[Done]', '']
+
+        sub = f'Notes {s}'
+        out += ['~' * (len(sub) + 3), sub, '~' * (len(sub) + 3), '']
+
+    if attachments:
+        out += ['Attachments', '-----------', '']
+        for web_path in attachments:
+            if web_path.endswith('.pdf'):
+                out += [f'- `{Path(web_path).name} </{web_path}>`_']
+            else:
+                out += ['', f'.. figure:: /{web_path}', '   :width: 600px', '', '   A synthetic figure.', '']
+        out.append('')
+    return '\n'.join(out) + '\n'
+
+
+def generate_corpus(root: Path, posts: int, attachments: int, sections: int, rows: int,
+                    code_lines: int, seed: int = 1) -> dict:
+    """Write a synthetic Jekyll site (config, posts, attachments) under `root`."""
+    rng = random.Random(seed)
+    (root / '_posts').mkdir(parents=True, exist_ok=True)
+    (root / '_config.yml').write_text('title: Benchmark\nbaseurl: "/posts"\nurl: "https://example.com"\n'
+                                      'attachments_dir: "attachments"\n', encoding='utf-8')
+
+    by_post = {i: [] for i in range(posts)}
+    total_bytes = 0
+    for a in range(attachments):
+        post = a % posts
+        folder, ext = ATTACHMENT_KINDS[a % len(ATTACHMENT_KINDS)]
+        rel = f'attachments/posts/2025-01-{post % 28 + 1:02d}-synthetic-post-{post}/{folder}/file-{a}{ext}'
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = make_png(rng) if ext == '.png' else make_pdf(rng, f'Synthetic document {a}')
+        path.write_bytes(data)
+        total_bytes += len(data)
+        by_post[post].append(rel)
+
+    post_bytes = 0
+    for i in range(posts):
+        text = make_post(i, sections, rows, code_lines, by_post[i])
+        name = f'2025-01-{i % 28 + 1:02d}-synthetic-post-{i}.rst'
+        (root / '_posts' / name).write_text(text, encoding='utf-8')
+        post_bytes += len(text.encode('utf-8'))
+
+    return {'posts': posts, 'attachments': attachments, 'sections': sections, 'rows': rows,
+            'code_lines': code_lines, 'seed': seed, 'post_bytes': post_bytes, 'attachment_bytes': total_bytes}
+
+
+def measure(func, repeat: int, setup=None) -> dict:
+    """Run `func` `repeat` times (after `setup`, untimed) and summarise wall times."""
+    runs = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - started)
+    return {'best': min(runs), 'mean': sum(runs) / len(runs), 'runs': runs}
+
+
+def bench_rst(root: Path, repeat: int) -> dict:
+    """transform.render() over every post, with time spent in directives.Pygments split out."""
+    transform._fragment_cache.max_bytes = 0
+    directives.highlight_cache.max_bytes = 0
+    directives.highlight_jobs = 1
+
+    writer = transform.Writer()
+    opts, _ = transform._build_option_parser(writer, 'fragment').parse_args(['--initial-header-level=2'])
+    settings = transform._base_settings(opts)
+    documents = []
+    for path in sorted((root / '_posts').glob('*.rst')):
+        body, _ = transform._split_front_matter(path.read_text(encoding='utf-8'))
+        documents.append((str(path), body))
+
+    pygments_seconds = []
+    original_run = directives.Pygments.run
+
+    def timed_run(self):
+        started = time.perf_counter()
+        try:
+            return original_run(self)
+        finally:
+            pygments_seconds[-1] += time.perf_counter() - started
+
+    def render_all():
+        pygments_seconds.append(0.0)
+        for source_path, body in documents:
+            transform.render(body, settings, 'fragment', writer=writer, source_path=source_path)
+
+    directives.Pygments.run = timed_run
+    try:
+        results = {'transform.render': measure(render_all, repeat)}
+    finally:
+        directives.Pygments.run = original_run
+    results['directives.Pygments'] = {'best': min(pygments_seconds),
+                                      'mean': sum(pygments_seconds) / len(pygments_seconds),
+                                      'runs': pygments_seconds}
+
+    bodies = [body for _, body in documents]
+    for name, func in [('preprocess.markdown_tables', transform._convert_markdown_tables_to_grid),
+                       ('preprocess.grid_tables', transform._normalize_grid_tables),
+                       ('preprocess.headings', transform._normalize_heading_adornments),
+                       ('preprocess.single_pass', transform._preprocess_rst)]:
+        results[name] = measure(lambda func=func: [func(body) for body in bodies], repeat)
+    for result in results.values():
+        result['items'] = len(documents)
+    return results
+
+
+def bench_attachments(root: Path, repeat: int) -> dict:
+    def generate(use_index):
+        with contextlib.redirect_stdout(io.StringIO()):
+            AttachmentDataGenerator(str(root), use_index=use_index).generate()
+
+    def clear_index():
+        shutil.rmtree(root / '.attachment-index', ignore_errors=True)
+
+    results = {'AttachmentDataGenerator.generate': measure(lambda: generate(False), repeat)}
+    # Nothing changes between runs, so every document comes from the index
+    clear_index()
+    generate(True)
+    results['AttachmentDataGenerator.generate (warm index)'] = measure(lambda: generate(True), repeat)
+    clear_index()
+    return results
+
+
+def bench_format(root: Path, repeat: int) -> dict:
+    work = root / '_format_posts'
+
+    def fresh_copy():
+        shutil.rmtree(work, ignore_errors=True)
+        shutil.copytree(root / '_posts', work)
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            format_rst.main(work)
+
+    result = measure(run, repeat, setup=fresh_copy)
+    shutil.rmtree(work, ignore_errors=True)
+    return {'format_rst.main': result}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results: dict, baseline=None) -> None:
+    print(f"{'benchmark':46} {'best':>10} {'mean':>10}" + (f" {'vs baseline':>12}" if baseline else ''))
+    for name, result in results.items():
+        line = f"{name:46} {result['best'] * 1000:8.1f}ms {result['mean'] * 1000:8.1f}ms"
+        if baseline and name in baseline:
+            line += f" {baseline[name]['best'] / result['best']:11.2f}x"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--posts', type=int, default=19)
+    parser.add_argument('--attachments', type=int, default=71)
+    parser.add_argument('--sections', type=int, default=6, help='Sections per post')
+    parser.add_argument('--rows', type=int, default=12, help='Rows per table')
+    parser.add_argument('--code-lines', type=int, default=30, help='Lines per code block')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', choices=['rst', 'attachments', 'format'], action='append',
+                        help='Run only these benchmark groups (repeatable)')
+    parser.add_argument('--output', help='Write machine-readable results to this JSON file')
+    parser.add_argument('--compare', help='Earlier results JSON to compare against')
+    parser.add_argument('--keep-corpus', metavar='DIR', help='Generate the corpus in DIR and keep it')
+    args = parser.parse_args()
+
+    if args.posts < 1:
+        parser.error('--posts must be at least 1')
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+
+    groups = args.only or ['rst', 'attachments', 'format']
+    with contextlib.ExitStack() as stack:
+        if args.keep_corpus:
+            root = Path(args.keep_corpus).resolve()
+            if root.exists() and any(root.iterdir()):
+                parser.error(f'{root} is not empty')
+        else:
+            root = Path(stack.enter_context(tempfile.TemporaryDirectory(prefix='bench-corpus-')))
+
+        started = time.perf_counter()
+        corpus = generate_corpus(root, args.posts, args.attachments, args.sections, args.rows,
+                                 args.code_lines, args.seed)
+        print(f"Corpus: {corpus['posts']} posts ({corpus['post_bytes'] / 1024:.0f} KiB), "
+              f"{corpus['attachments']} attachments ({corpus['attachment_bytes'] / 1024:.0f} KiB), "
+              f"generated in {time.perf_counter() - started:.2f}s\n")
+
+        results = {}
+        if 'rst' in groups:
+            results.update(bench_rst(root, args.repeat))
+        if 'attachments' in groups:
+            results.update(bench_attachments(root, args.repeat))
+        if 'format' in groups:
+            results.update(bench_format(root, args.repeat))
+
+    print_results(results, baseline)
+
+    if args.output:
+        report = {
+            'meta': {
+                'commit': git_commit(),
+                'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'docutils': docutils.__version__,
+                'pygments': pygments.__version__,
+                'repeat': args.repeat,
+                'corpus': corpus,
+            },
+            'results': results,
+        }
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f'\nResults written to {args.output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -123,9 +123,9 @@ def format_file(filepath: Path) -> dict:
         return {'status': 'error', 'error': str(e)}
 
 
-def main():
-    """Main entry point."""
-    posts_dir = Path(__file__).parent.parent / '_posts'
+def main(posts_dir=None):
+    """Main entry point. Formats `posts_dir` (default: the site's _posts)."""
+    posts_dir = Path(posts_dir) if posts_dir else Path(__file__).parent.parent / '_posts'
 
     if not posts_dir.exists():
         print(f"Error: {posts_dir} not found", file=sys.stderr)
@@ -10,16 +10,422 @@ import re
 import yaml
 import glob
 import json
+import hashlib
+import argparse
+import attachment_media
 from pathlib import Path
-from urllib.parse import urljoin
+from urllib.parse import urljoin, quote
 from collections import defaultdict
+from functools import cached_property
+
+# libyaml's loader and dumper are several times faster than the pure-Python ones
+try:
+    from yaml import CSafeLoader as YamlLoader, CSafeDumper as YamlDumper
+except ImportError:
+    from yaml import SafeLoader as YamlLoader, SafeDumper as YamlDumper
+
+
+def _trie_pattern(trie):
+    """Regex source matching the longest word stored in `trie` (nested dicts, '' marks a word end)"""
+    alternatives = [re.escape(ch) + _trie_pattern(child) for ch, child in sorted(trie.items()) if ch]
+    if not alternatives:
+        return ''
+    pattern = alternatives[0] if len(alternatives) == 1 else '(?:' + '|'.join(alternatives) + ')'
+    return f'(?:{pattern})?' if '' in trie else pattern
+
+
+class AttachmentMatcher:
+    """Finds which known attachment filenames a document references.
+
+    Built once per run. Any reference the link patterns can find is a known
+    filename occurring in the body, so when the attachments prefix appears
+    in the body the answer is simply every known filename it contains. Those
+    come from one pass of a regex compiled from a trie of all the filenames
+    (an Aho-Corasick-style automaton; a lookahead makes matches overlap).
+    The link patterns are only needed when the prefix appears in another
+    case, e.g. /Attachments/.
+    """
+
+    def __init__(self, filenames, web_prefix):
+        self.filenames = set(filenames)
+        # "/attachments/" contains "attachments/", so one check covers both
+        self.marker = web_prefix.lstrip('/')
+        self.marker_pattern = re.compile(re.escape(self.marker), re.IGNORECASE)
+
+        prefix = re.escape(web_prefix)
+        prefix_no_slash = re.escape(self.marker)
+        self.reference_patterns = [re.compile(pattern, re.IGNORECASE) for pattern in [
+            rf'!\[.*?\]\(([^)]*(?:{prefix}|{prefix_no_slash})[^)]+)\)',
+            rf'src=[\'\"]([^\'\"]*(?:{prefix}|{prefix_no_slash})[^\'\"]+)[\'\"]',
+            rf'href=[\'\"]([^\'\"]*(?:{prefix}|{prefix_no_slash})[^\'\"]+)[\'\"]',
+            rf'showImageModal\([\'\"]([^\'\"]*(?:{prefix}|{prefix_no_slash})[^\'\"]+)[\'\"]',
+            rf'showPdfModal\([\'\"]([^\'\"]*(?:{prefix}|{prefix_no_slash})[^\'\"]+)[\'\"]',
+            rf'(?:{prefix}|{prefix_no_slash})[^\s]*([^/\s]+\.[a-zA-Z0-9]+)'
+        ]]
+
+        # The automaton reports the longest filename starting at each position;
+        # shorter filenames that are prefixes of it start there too
+        trie = {}
+        for filename in self.filenames:
+            node = trie
+            for ch in filename:
+                node = node.setdefault(ch, {})
+            node[''] = {}
+        self.prefixes = {}
+        for filename in self.filenames:
+            node = trie
+            found = []
+            for i, ch in enumerate(filename):
+                node = node[ch]
+                if '' in node:
+                    found.append(filename[:i + 1])
+            self.prefixes[filename] = found
+        self.filename_pattern = re.compile(f'(?=({_trie_pattern(trie)}))') if trie else None
+
+    def find(self, body):
+        """Return the set of known filenames referenced in `body`"""
+        if self.marker in body:
+            if self.filename_pattern is None:
+                return set()
+            found = set()
+            for longest in {match.group(1) for match in self.filename_pattern.finditer(body)}:
+                found.update(self.prefixes[longest])
+            return found
+
+        if not self.marker_pattern.search(body):
+            return set()
+        found = set()
+        for pattern in self.reference_patterns:
+            for match in pattern.finditer(body):
+                found.add(os.path.basename(match.group(1)))
+        return found & self.filenames
+
+
+class DocumentIndex:
+    """Per-document scan results kept between runs in .attachment-index/.
+
+    Each post and page is stored under its path relative to the site root
+    with its mtime, size and SHA-256, the title and date taken from its
+    front matter, its excerpt and the attachment filenames it references.
+    A document whose mtime and size are unchanged is not read again; one
+    whose bytes are unchanged is not parsed again. The filenames known to
+    the previous run are stored too: references to removed attachments are
+    dropped from the stored sets, and added attachments are looked for only
+    in documents that contain the attachments prefix (no other document can
+    reference any attachment).
+
+    Everything is discarded when this script or the attachments prefix
+    changes.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path, web_prefix, filenames):
+        self.path = Path(path)
+        self.settings = hashlib.sha256(
+            f"{self.VERSION}\0{web_prefix}\0".encode('utf-8') + Path(__file__).read_bytes()
+        ).hexdigest()
+        self.filenames = set(filenames)
+        self.documents = {}
+        self.seen = {}
+        self.reused = 0
+        self.scanned = 0
+
+        stored = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            pass
+        if isinstance(stored, dict) and stored.get('settings') == self.settings:
+            self.documents = stored.get('documents', {})
+            self.removed = set(stored.get('filenames', [])) - self.filenames
+            self.added = self.filenames - set(stored.get('filenames', []))
+        else:
+            self.removed = set()
+            self.added = set(self.filenames)
+        # Matches only the added filenames, in documents scanned before they existed
+        self.added_matcher = AttachmentMatcher(self.added, web_prefix) if self.added and self.documents else None
+
+    def lookup(self, key, stat):
+        """Return the stored entry for `key` if its mtime and size still match"""
+        entry = self.documents.get(key)
+        if entry and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+            return entry
+        return None
+
+    def lookup_digest(self, key, stat, digest):
+        """Return the stored entry for `key` if its content is unchanged (a touched file)"""
+        entry = self.documents.get(key)
+        if entry and entry['sha256'] == digest:
+            entry['mtime_ns'] = stat.st_mtime_ns
+            entry['size'] = stat.st_size
+            return entry
+        return None
+
+    def update_filenames(self, entry, body=None):
+        """Bring a stored entry's references up to date with the current attachments"""
+        if self.removed:
+            entry['filenames'] = [name for name in entry['filenames'] if name not in self.removed]
+        if self.added_matcher is not None and entry['marker']:
+            found = self.added_matcher.find(body)
+            if found:
+                entry['filenames'] = sorted(set(entry['filenames']) | found)
+
+    def needs_body(self, entry):
+        """Whether updating `entry` requires the document text"""
+        return self.added_matcher is not None and entry['marker']
+
+    def store(self, key, entry):
+        self.seen[key] = entry
+
+    def save(self):
+        """Write the entries seen this run (documents since deleted are dropped)"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            'settings': self.settings,
+            'filenames': sorted(self.filenames),
+            'documents': self.seen,
+        }
+        _write_json(self.path, data)
+
+
+class ContentHashes:
+    """SHA-256 of attachment files, kept in .attachment-index/ between runs.
+
+    A file's stored digest is reused while its mtime and size are
+    unchanged; anything else is read in HASH_CHUNK_BYTES chunks.
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path is not None else None
+        self.stored = {}
+        self.digests = {}
+        if self.path is not None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.stored = json.load(f)
+            except (OSError, ValueError):
+                pass
+            if not isinstance(self.stored, dict):
+                self.stored = {}
+
+    def digest(self, key, file_path, stat):
+        """Hex SHA-256 of the file at `file_path` (None if it cannot be read)"""
+        stored = self.stored.get(key)
+        if stored and stored[0] == stat.st_mtime_ns and stored[1] == stat.st_size:
+            digest = stored[2]
+        else:
+            try:
+                digest = file_sha256(file_path)
+            except OSError:
+                return None
+        self.digests[key] = [stat.st_mtime_ns, stat.st_size, digest]
+        return digest
+
+    def save(self):
+        """Write the digests of the files seen this run"""
+        if self.path is not None:
+            _write_json(self.path, self.digests)
+
+
+def _write_json(path, data):
+    """Write `data` as JSON to `path` (see write_if_changed)"""
+    return write_if_changed(path, json.dumps(data, ensure_ascii=False))
+
+
+def write_if_changed(path, text):
+    """
+    Write `text` to `path` unless the file already holds exactly these bytes.
+
+    The new contents go to a temporary file that is renamed over `path`, so
+    readers never see half of it. Leaving unchanged files alone keeps their
+    mtimes, and with them `jekyll serve` from regenerating the site. Returns
+    whether the file was written.
+    """
+    data = text.encode('utf-8')
+    try:
+        if path.stat().st_size == len(data) and path.read_bytes() == data:
+            return False
+    except OSError:
+        pass
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    temp_path.write_bytes(data)
+    os.replace(temp_path, path)
+    return True
+
+
+# Read size for streaming file hashes
+HASH_CHUNK_BYTES = 1 << 20
+
+
+def file_sha256(file_path):
+    """Hex SHA-256 of a file, read in chunks into one reused buffer"""
+    digest = hashlib.sha256()
+    buffer = bytearray(HASH_CHUNK_BYTES)
+    view = memoryview(buffer)
+    with open(file_path, 'rb', buffering=0) as f:
+        while True:
+            size = f.readinto(buffer)
+            if not size:
+                break
+            digest.update(view[:size])
+    return digest.hexdigest()
+
+
+def walk_files(directory):
+    """Yield an os.DirEntry for every file under `directory`.
+
+    Same files in the same order as Path(directory).rglob("*") filtered
+    with is_file(): each directory's entries, then each subdirectory in
+    turn (symlinked directories are not entered). Each directory is
+    listed once and file types come from the listing.
+    """
+    try:
+        with os.scandir(directory) as entries:
+            entries = list(entries)
+    except PermissionError:
+        return
+    subdirectories = []
+    for entry in entries:
+        if entry.is_file():
+            yield entry
+        elif entry.is_dir(follow_symlinks=False):
+            subdirectories.append(entry.path)
+    for subdirectory in subdirectories:
+        yield from walk_files(subdirectory)
+
+
+class DocumentRecord:
+    """One post or page being scanned.
+
+    The front matter is parsed, and the title, date and excerpt derived
+    from it, on first use and at most once. A document that never mentions
+    the attachments prefix needs none of them.
+    """
+
+    def __init__(self, generator, path, content):
+        self.generator = generator
+        self.path = path
+        self.content = content
+
+    @cached_property
+    def parsed(self):
+        return self.generator.parse_frontmatter(self.content)
+
+    @property
+    def frontmatter(self):
+        return self.parsed[0]
+
+    @property
+    def body(self):
+        return self.parsed[1]
+
+    @cached_property
+    def title(self):
+        return self.frontmatter.get('title', self.path.stem)
+
+    @cached_property
+    def date(self):
+        date = self.frontmatter.get('date', '')
+        if hasattr(date, 'strftime'):
+            return date.strftime('%Y-%m-%d')
+        elif date:
+            return str(date)[:10]  # Extract date part if it's a string
+        return date
+
+    @cached_property
+    def excerpt(self):
+        return self.generator.extract_excerpt(self.body)
+
+
+# Sets of identical attachments (and image failures) listed in the log
+DUPLICATE_GROUPS_SHOWN = 10
+
+# Characters of a body cleaned for its excerpt, at first
+EXCERPT_SCAN_CHARS = 400
+
+# Below this many documents to scan, a process pool costs more than it saves
+SCAN_POOL_MIN_DOCUMENTS = 32
+
+# Below this many images or PDFs to process, a process pool costs more than it saves
+MEDIA_POOL_MIN_FILES = 2
+
+# Downscaled image copies and PDF previews, relative to the site root
+THUMBNAILS_DIR = "attachments-data/thumbs"
+
+# Public JSON endpoints, relative to the site root; the reference shards live
+# in references/ below it, named after their contents (galleries/ held
+# gallery shards no page read, and is only emptied)
+PUBLIC_DATA_DIR = "attachments-data"
+SHARD_DIRS = ("galleries", "references")
+_SHARD_NAME = re.compile(r'[\w-]+-[0-9a-f]{16}\.json')
+
+# Reference shards hold about this many attachments each (the number of
+# shards is the power of two that keeps them at or below it)
+REFERENCES_PER_SHARD = 64
+
+
+def reference_bucket(filename, buckets):
+    """Shard of `filename`'s references: 32-bit FNV-1a of its UTF-8 bytes modulo `buckets`
+    (assets/js/attachments.js computes the same)"""
+    value = 0x811c9dc5
+    for byte in filename.encode('utf-8'):
+        value = ((value ^ byte) * 0x01000193) & 0xffffffff
+    return value % buckets
+
+
+def map_jobs(func, items, jobs=None, min_items=2, initializer=None, initargs=()):
+    """[func(item) for item in items], across `jobs` processes (default: CPU count).
+
+    Runs serially when `jobs` is 1, when there are fewer than `min_items`
+    items, or when the pool breaks (which must not fail the build).
+    """
+    jobs = jobs or os.cpu_count() or 1
+    if jobs > 1 and len(items) >= min_items:
+        try:
+            # Imported here: it costs more start-up time than a small site takes to process
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=jobs, initializer=initializer, initargs=initargs) as pool:
+                chunksize = max(1, len(items) // (jobs * 4))
+                return list(pool.map(func, items, chunksize=chunksize))
+        except Exception as e:
+            print(f"⚠️  Process pool failed ({e}), running serially")
+    if initializer is not None:
+        initializer(*initargs)
+    return [func(item) for item in items]
+
+
+# Generator used by the scan jobs of this process (a pool worker or the main one)
+_scan_generator = None
+
+
+def _init_scan_worker(generator, filenames):
+    global _scan_generator
+    _scan_generator = generator
+    generator.matcher = AttachmentMatcher(filenames, generator.attachments_web_prefix)
+
+
+def _scan_job(doc_path):
+    try:
+        return _scan_generator.scan_file(doc_path)
+    except Exception as e:
+        return {'error': str(e)}
+
 
 class AttachmentDataGenerator:
-    def __init__(self, site_root="."):
+    def __init__(self, site_root=".", use_index=True, jobs=None):
+        self.jobs = jobs
+        self.matcher = None
         self.site_root = Path(site_root).resolve()
         self.posts_dir = self.site_root / "_posts"
         self.pages_dirs = [self.site_root / "_tabs", self.site_root]
         self.data_dir = self.site_root / "_data"
+        self.index_path = self.site_root / ".attachment-index" / "documents.json" if use_index else None
+        self.hashes_path = self.site_root / ".attachment-index" / "hashes.json" if use_index else None
+        self.images_path = self.site_root / ".attachment-index" / "images.json" if use_index else None
+        self.pdfs_path = self.site_root / ".attachment-index" / "pdfs.json" if use_index else None
 
         # Load Jekyll config
         self.config = self.load_config()
@@ -46,7 +452,7 @@ class AttachmentDataGenerator:
         config_path = self.site_root / "_config.yml"
         if config_path.exists():
             with open(config_path, 'r', encoding='utf-8') as f:
-                return yaml.safe_load(f) or {}
+                return yaml.load(f, Loader=YamlLoader) or {}
         return {}
 
     def scan_attachments(self):
@@ -56,25 +462,31 @@ class AttachmentDataGenerator:
             return []
 
         attachments = []
-        for file_path in self.attachments_dir.rglob("*"):
-            if file_path.is_file() and not file_path.name.startswith('.'):
+        hashes = ContentHashes(self.hashes_path)
+        root_prefix = os.path.join(str(self.site_root), '')
+        for entry in walk_files(self.attachments_dir):
+            if not entry.name.startswith('.'):
+                stat = entry.stat()
+                file_path = Path(entry.path)
+
                 # Calculate relative paths
-                rel_path = file_path.relative_to(self.site_root)
-                web_path = str(rel_path).replace('\\', '/')
+                rel_path = entry.path[len(root_prefix):]
+                web_path = rel_path.replace('\\', '/')
                 relative_url = f"/{web_path}"
 
                 # Determine category from path
-                category = self.determine_category(str(rel_path))
+                category = self.determine_category(rel_path)
 
                 attachment_info = {
-                    'filename': file_path.name,
-                    'path': str(file_path),
+                    'filename': entry.name,
+                    'path': entry.path,
                     'web_path': web_path,
                     'url': relative_url,
                     'name': file_path.stem,
                     'ext': file_path.suffix,
                     'category': category,
-                    'size': file_path.stat().st_size if file_path.exists() else 0
+                    'size': stat.st_size,
+                    'sha256': hashes.digest(web_path, entry.path, stat),
                 }
 
                 # Only generate absolute_url if explicitly requested
@@ -86,9 +498,35 @@ class AttachmentDataGenerator:
                     attachment_info['absolute_url'] = absolute_url
                 attachments.append(attachment_info)
 
+        hashes.save()
         print(f"📎 Found {len(attachments)} attachments")
         return attachments
 
+    def find_duplicates(self, attachments):
+        """Group non-empty attachments with identical content, largest waste first"""
+        by_digest = defaultdict(list)
+        for attachment in attachments:
+            if attachment['size'] and attachment['sha256']:
+                by_digest[attachment['sha256']].append(attachment)
+        groups = [group for group in by_digest.values() if len(group) > 1]
+        groups.sort(key=lambda group: (-group[0]['size'] * (len(group) - 1), group[0]['web_path']))
+        return groups
+
+    def report_duplicates(self, attachments):
+        """Print byte-identical attachments stored under different paths"""
+        groups = self.find_duplicates(attachments)
+        if not groups:
+            return
+        wasted = sum(group[0]['size'] * (len(group) - 1) for group in groups)
+        print(f"\n🧬 Duplicate attachments: {len(groups)} sets of identical files, "
+              f"{wasted / 1024:.1f} KiB in extra copies")
+        for group in groups[:DUPLICATE_GROUPS_SHOWN]:
+            print(f"   • {group[0]['size'] / 1024:.1f} KiB × {len(group)}:")
+            for attachment in group:
+                print(f"      - {attachment['web_path']}")
+        if len(groups) > DUPLICATE_GROUPS_SHOWN:
+            print(f"   … and {len(groups) - DUPLICATE_GROUPS_SHOWN} more")
+
     def determine_category(self, path_str):
         """Determine attachment category from path"""
         path_lower = path_str.lower()
@@ -123,92 +561,184 @@ class AttachmentDataGenerator:
                 ref_data['absolute_url'] = attachment['absolute_url']
             references[filename] = ref_data
 
-        # Scan posts
+        index = None
+        if self.index_path is not None:
+            index = DocumentIndex(self.index_path, self.attachments_web_prefix, references.keys())
+
+        # Map: reuse indexed results, scan everything else (possibly in parallel)
+        documents = []
+        to_scan = []
+        for doc_path, doc_type in self.iter_documents():
+            try:
+                entry = self.indexed_entry(doc_path, index) if index is not None else None
+            except Exception as e:
+                entry = {'error': str(e)}
+            if entry is None:
+                to_scan.append(doc_path)
+            documents.append((doc_path, doc_type, entry))
+        scanned = iter(self.scan_files(to_scan, references.keys()))
+
+        # Merge in document order, so the output does not depend on the pool
+        seen_urls = {}
+        for doc_path, doc_type, entry in documents:
+            if entry is None:
+                entry = next(scanned)
+                if index is not None and 'error' not in entry:
+                    index.scanned += 1
+                    if self.is_indexable(entry):
+                        index.store(self.index_key(doc_path), entry)
+            if 'error' in entry:
+                print(f"⚠️  Error scanning {doc_path}: {entry['error']}")
+                continue
+            self.add_references(references, entry, self.document_url(doc_path, doc_type), doc_type, seen_urls)
+
+        if index is not None:
+            index.save()
+            print(f"🗂️  Document index: {index.reused} unchanged, {index.scanned} scanned")
+
+        # Calculate totals
+        for filename, ref_data in references.items():
+            ref_data['total_references'] = len(ref_data['posts']) + len(ref_data['pages'])
+
+        return references
+
+    def iter_documents(self):
+        """Yield (path, doc_type) for every post and page, in scan order"""
         if self.posts_dir.exists():
             for post_file in self.posts_dir.rglob("*"):
                 if post_file.is_file() and post_file.suffix in ['.md', '.rst', '.html']:
-                    self.scan_document(post_file, references, 'posts')
+                    yield post_file, 'posts'
 
-        # Scan pages
         for pages_dir in self.pages_dirs:
             if pages_dir.exists():
                 for page_file in pages_dir.glob("*.md"):
                     if page_file.is_file():
-                        self.scan_document(page_file, references, 'pages')
-
-        # Calculate totals
-        for filename, ref_data in references.items():
-            ref_data['total_references'] = len(ref_data['posts']) + len(ref_data['pages'])
-
-        return references
+                        yield page_file, 'pages'
+
+    def document_url(self, doc_path, doc_type):
+        """URL of a post or page (following Jekyll URL structure)"""
+        if doc_type == 'posts':
+            # Remove date prefix (YYYY-MM-DD-) from post filename to get slug
+            post_slug = doc_path.stem[11:] if len(doc_path.stem) > 11 else doc_path.stem
+            return f"{self.base_url}/{post_slug}/" if self.base_url else f"/{post_slug}/"
+        return f"{self.base_url}/{doc_path.stem}/" if self.base_url else f"/{doc_path.stem}/"
+
+    def index_key(self, doc_path):
+        return doc_path.relative_to(self.site_root).as_posix()
+
+    def read_document(self, doc_path):
+        """Return the raw bytes and decoded text (newlines translated as in text mode)"""
+        data = doc_path.read_bytes()
+        content = data.decode('utf-8')
+        if '\r' in content:
+            content = content.replace('\r\n', '\n').replace('\r', '\n')
+        return data, content
+
+    def indexed_entry(self, doc_path, index):
+        """The index's result for an unchanged document, or None if it must be scanned"""
+        key = self.index_key(doc_path)
+        stat = doc_path.stat()
+        entry = index.lookup(key, stat)
+        content = None
+        if entry is None or index.needs_body(entry):
+            data, content = self.read_document(doc_path)
+            if entry is None:
+                entry = index.lookup_digest(key, stat, hashlib.sha256(data).hexdigest())
+                if entry is None:
+                    return None
+
+        if content is not None:
+            body = content[entry['body_offset']:]
+            index.update_filenames(entry, body)
+            # Its first reference, to an attachment added since the last run
+            if entry['filenames'] and entry['excerpt'] is None:
+                entry['excerpt'] = self.extract_excerpt(body)
+        else:
+            index.update_filenames(entry)
+        index.reused += 1
+        index.store(key, entry)
+        return entry
+
+    def scan_files(self, doc_paths, filenames):
+        """Scan documents in a process pool when there are enough of them.
+
+        Returns one entry per path, in order; a document that cannot be read
+        gets {'error': message} instead.
+        """
+        return map_jobs(_scan_job, doc_paths, self.jobs, SCAN_POOL_MIN_DOCUMENTS,
+                        initializer=_init_scan_worker, initargs=(self, list(filenames)))
+
+    def scan_file(self, doc_path):
+        """Read and scan one document; pure apart from reading the file"""
+        stat = doc_path.stat()
+        data, content = self.read_document(doc_path)
+        entry = self.scan_text(doc_path, content)
+        entry.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size, sha256=hashlib.sha256(data).hexdigest())
+        return entry
+
+    def scan_text(self, doc_path, content):
+        """Find the attachments one document references.
+
+        Only a document containing the attachments prefix can reference one,
+        so the front matter of any other is never parsed. The excerpt is
+        only needed once something is referenced.
+        """
+        if not self.matcher.marker_pattern.search(content):
+            return {'title': None, 'date': None, 'excerpt': None, 'marker': False,
+                    'body_offset': None, 'filenames': []}
+
+        record = DocumentRecord(self, doc_path, content)
+        marker = bool(self.matcher.marker_pattern.search(record.body))
+        filenames = sorted(self.matcher.find(record.body)) if marker else []
+        return {
+            'title': record.title,
+            'date': record.date,
+            'excerpt': record.excerpt if filenames else None,
+            'marker': marker,
+            'body_offset': len(content) - len(record.body),
+            'filenames': filenames,
+        }
+
+    def is_indexable(self, entry):
+        """Whether the front matter values survive a JSON round trip unchanged"""
+        return all(value is None or type(value) in (str, int, float, bool)
+                   for value in (entry['title'], entry['date']))
+
+    def add_references(self, references, entry, url, doc_type, seen_urls=None):
+        """Record a scanned document against every attachment it references.
+
+        `seen_urls` maps (filename, doc_type) to the URLs already recorded;
+        pass the same dict for every document of a scan.
+        """
+        if seen_urls is None:
+            seen_urls = {}
+        for filename in entry['filenames']:
+            if filename in references:
+                # Avoid duplicates (two documents with the same URL)
+                urls = seen_urls.get((filename, doc_type))
+                if urls is None:
+                    urls = seen_urls[(filename, doc_type)] = {ref['url'] for ref in references[filename][doc_type]}
+                if url not in urls:
+                    urls.add(url)
+                    reference = {
+                        'title': entry['title'],
+                        'url': url,
+                        'date': entry['date'],
+                        'excerpt': entry['excerpt']
+                    }
+                    references[filename][doc_type].append(reference)
 
     def scan_document(self, doc_path, references, doc_type):
         """Scan a single document for attachment references"""
+        # Reuse the matcher while the known filenames stay the same
+        if self.matcher is None or self.matcher.filenames != references.keys():
+            self.matcher = AttachmentMatcher(references.keys(), self.attachments_web_prefix)
         try:
-            with open(doc_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-
-            # Extract frontmatter
-            frontmatter, body = self.parse_frontmatter(content)
-            title = frontmatter.get('title', doc_path.stem)
-            date = frontmatter.get('date', '')
-            if hasattr(date, 'strftime'):
-                date = date.strftime('%Y-%m-%d')
-            elif date:
-                date = str(date)[:10]  # Extract date part if it's a string
-
-            # Generate URL (following Jekyll URL structure)
-            if doc_type == 'posts':
-                # Remove date prefix (YYYY-MM-DD-) from post filename to get slug
-                post_slug = doc_path.stem[11:] if len(doc_path.stem) > 11 else doc_path.stem
-                url = f"{self.base_url}/{post_slug}/" if self.base_url else f"/{post_slug}/"
-            else:
-                url = f"{self.base_url}/{doc_path.stem}/" if self.base_url else f"/{doc_path.stem}/"
-
-            # Look for attachment references in content
-            prefix = re.escape(self.attachments_web_prefix)
-            prefix_no_slash = re.escape(self.attachments_web_prefix.lstrip('/'))
-            attachment_patterns = [
-                rf'!\[.*?\]\(([^)]*(?:{prefix}|{prefix_no_slash})[^)]+)\)',
-                rf'src=[\'\"]([^\'\"]*(?:{prefix}|{prefix_no_slash})[^\'\"]+)[\'\"]',
-                rf'href=[\'\"]([^\'\"]*(?:{prefix}|{prefix_no_slash})[^\'\"]+)[\'\"]',
-                rf'showImageModal\([\'\"]([^\'\"]*(?:{prefix}|{prefix_no_slash})[^\'\"]+)[\'\"]',
-                rf'showPdfModal\([\'\"]([^\'\"]*(?:{prefix}|{prefix_no_slash})[^\'\"]+)[\'\"]',
-                rf'(?:{prefix}|{prefix_no_slash})[^\s]*([^/\s]+\.[a-zA-Z0-9]+)'
-            ]
-
-            found_files = set()
-
-            for pattern in attachment_patterns:
-                matches = re.finditer(pattern, body, re.IGNORECASE)
-                for match in matches:
-                    attachment_path = match.group(1) if match.groups() else match.group(0)
-                    filename = os.path.basename(attachment_path)
-                    found_files.add(filename)
-
-            # Also scan for direct filename mentions in attachment context
-            base_marker_with_slash = self.attachments_web_prefix
-            base_marker_no_slash = self.attachments_web_prefix.lstrip('/')
-            for filename in references.keys():
-                if filename in body and (base_marker_with_slash in body or base_marker_no_slash in body):
-                    found_files.add(filename)
-
-            # Add references
-            for filename in found_files:
-                if filename in references:
-                    # Avoid duplicates
-                    existing = any(ref['url'] == url for ref in references[filename][doc_type])
-                    if not existing:
-                        reference = {
-                            'title': title,
-                            'url': url,
-                            'date': date,
-                            'excerpt': self.extract_excerpt(body)
-                        }
-                        references[filename][doc_type].append(reference)
-
+            entry = self.scan_text(doc_path, self.read_document(doc_path)[1])
         except Exception as e:
             print(f"⚠️  Error scanning {doc_path}: {e}")
+            return
+        self.add_references(references, entry, self.document_url(doc_path, doc_type), doc_type)
 
     def parse_frontmatter(self, content):
         """Parse Jekyll frontmatter from content"""
@@ -216,7 +746,7 @@ class AttachmentDataGenerator:
             try:
                 parts = content.split('---', 2)
                 if len(parts) >= 3:
-                    frontmatter = yaml.safe_load(parts[1]) or {}
+                    frontmatter = yaml.load(parts[1], Loader=YamlLoader) or {}
                     body = parts[2]
                     return frontmatter, body
             except yaml.YAMLError:
@@ -225,15 +755,165 @@ class AttachmentDataGenerator:
 
     def extract_excerpt(self, content):
         """Extract excerpt from content"""
-        # Remove markdown/rst syntax and get first few sentences
-        clean_content = re.sub(r'[#*`_\[\]()]+', ' ', content)
-        clean_content = re.sub(r'\s+', ' ', clean_content).strip()
+        # Only the start of the body is cleaned; a longer prefix is tried
+        # only while it does not yet make more than 100 characters
+        limit = EXCERPT_SCAN_CHARS
+        while True:
+            # Remove markdown/rst syntax and get first few sentences
+            clean_content = re.sub(r'[#*`_\[\]()]+', ' ', content[:limit])
+            clean_content = re.sub(r'\s+', ' ', clean_content).strip()
+
+            if len(clean_content) > 100:
+                return clean_content[:97] + '...'
+            if limit >= len(content):
+                return clean_content
+            limit *= 4
+
+    def process_images(self, attachments):
+        """Thumbnails and responsive widths for every image, keyed by content hash.
+
+        Images whose variants all exist (per .attachment-index/images.json)
+        are not opened; the rest are processed in a process pool. Copies no
+        image uses any more are deleted.
+        """
+        images = {}
+        for attachment in attachments:
+            if attachment_media.is_image(attachment['ext']) and attachment['sha256']:
+                images.setdefault((attachment['sha256'], attachment['ext'].lower()), attachment)
+        if not images:
+            return {}
+        if not attachment_media.images_available():
+            print("ℹ️  Pillow is not installed; gallery images keep their full-size URLs")
+            return {}
+
+        print("🖼️  Generating image thumbnails...")
+        output_dir = self.site_root / THUMBNAILS_DIR
+        output_dir.mkdir(parents=True, exist_ok=True)
+        stored = self.load_media_cache(self.images_path)
+
+        results = {}
+        jobs = []
+        for (digest, ext), attachment in images.items():
+            meta = stored.get(digest)
+            if meta and all((output_dir / attachment_media.variant_name(digest, width, ext)).exists()
+                            for width in meta['widths']):
+                results[digest] = meta
+            else:
+                jobs.append((attachment['path'], digest, ext, str(output_dir)))
+        results.update(self.run_media_jobs('image', attachment_media.image_variants, jobs))
+
+        self.prune_media(output_dir, 'image', {
+            attachment_media.variant_name(digest, width, ext)
+            for digest, ext in images if digest in results
+            for width in results[digest]['widths']
+        })
+        if self.images_path is not None:
+            _write_json(self.images_path, results)
+
+        print(f"🖼️  Images: {len(images) - len(jobs)} unchanged, {len(jobs)} processed")
+        return results
+
+    def process_pdfs(self, attachments):
+        """Page count, title and first-page preview of every PDF, keyed by content hash.
+
+        Results are kept in .attachment-index/pdfs.json together with the
+        tools that produced them, so installing pypdf or poppler later
+        fills in the missing fields. Previews no PDF uses any more are
+        deleted.
+        """
+        pdfs = {}
+        for attachment in attachments:
+            if attachment['ext'].lower() == '.pdf' and attachment['sha256']:
+                pdfs.setdefault(attachment['sha256'], attachment)
+        if not pdfs:
+            return {}
+        tools = attachment_media.pdf_tools()
+        if not tools:
+            print("ℹ️  Neither pypdf nor pdftoppm is installed; PDFs get no page counts or previews")
+            return {}
+
+        print(f"📄 Reading PDF details ({', '.join(tools)})...")
+        output_dir = self.site_root / THUMBNAILS_DIR
+        output_dir.mkdir(parents=True, exist_ok=True)
+        stored = self.load_media_cache(self.pdfs_path)
+        stored = stored.get('documents', {}) if stored.get('tools') == tools else {}
+
+        results = {}
+        jobs = []
+        for digest, attachment in pdfs.items():
+            details = stored.get(digest)
+            if details and (details['preview'] is None or (output_dir / details['preview']).exists()):
+                results[digest] = details
+            else:
+                jobs.append((attachment['path'], digest, str(output_dir)))
+        results.update(self.run_media_jobs('PDF', attachment_media.pdf_details, jobs))
 
-        if len(clean_content) > 100:
-            return clean_content[:97] + '...'
-        return clean_content
+        if 'pdftoppm' in tools:
+            self.prune_media(output_dir, 'pdf', {details['preview'] for details in results.values()})
+        if self.pdfs_path is not None:
+            _write_json(self.pdfs_path, {'tools': tools, 'documents': results})
 
-    def generate_galleries(self, attachments):
+        print(f"📄 PDFs: {len(pdfs) - len(jobs)} unchanged, {len(jobs)} processed")
+        return results
+
+    def load_media_cache(self, path):
+        """A JSON object stored under .attachment-index/ ({} when missing or unreadable)"""
+        if path is None:
+            return {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return stored if isinstance(stored, dict) else {}
+
+    def run_media_jobs(self, kind, func, jobs):
+        """Run media jobs (digest second in each) in a pool; return {digest: result} of those that worked"""
+        results = {}
+        failed = []
+        for job, result in zip(jobs, map_jobs(func, jobs, self.jobs, MEDIA_POOL_MIN_FILES)):
+            if 'error' in result:
+                failed.append(f"{job[0]}: {result['error']}")
+            else:
+                results[job[1]] = result
+        for failure in failed[:DUPLICATE_GROUPS_SHOWN]:
+            print(f"⚠️  Could not process {kind} {failure}")
+        if len(failed) > DUPLICATE_GROUPS_SHOWN:
+            print(f"   … and {len(failed) - DUPLICATE_GROUPS_SHOWN} more")
+        return results
+
+    def prune_media(self, output_dir, kind, keep):
+        """Delete generated files of `kind` ('image' or 'pdf') not in `keep`"""
+        for entry in os.scandir(output_dir):
+            if attachment_media.media_kind(entry.name) == kind and entry.name not in keep:
+                os.unlink(entry.path)
+
+    def image_fields(self, attachment, image):
+        """Gallery fields pointing at an image's downscaled copies"""
+        variants = [(width, f"/{THUMBNAILS_DIR}/{attachment_media.variant_name(attachment['sha256'], width, attachment['ext'])}")
+                    for width in image['widths']]
+        # The original is the largest candidate (and the thumbnail of a small image)
+        candidates = [f"{url} {width}w" for width, url in variants]
+        candidates.append(f"{quote(attachment['url'])} {image['width']}w")
+        return {
+            'thumb_url': variants[0][1] if variants else attachment['url'],
+            'srcset': ', '.join(candidates),
+            'width': image['width'],
+            'height': image['height'],
+        }
+
+    def pdf_fields(self, details):
+        """Gallery fields describing a PDF without downloading it"""
+        fields = {}
+        if details['pages'] is not None:
+            fields['pages'] = details['pages']
+        if details['title']:
+            fields['title'] = details['title']
+        if details['preview']:
+            fields['preview_url'] = f"/{THUMBNAILS_DIR}/{details['preview']}"
+        return fields
+
+    def generate_galleries(self, attachments, images=None, pdfs=None):
         """Generate gallery data grouped by category"""
         print("🖼️  Generating gallery data...")
 
@@ -257,6 +937,13 @@ class AttachmentDataGenerator:
             if 'absolute_url' in attachment:
                 gallery_item['absolute_url'] = attachment['absolute_url']
 
+            image = images.get(attachment['sha256']) if images else None
+            if image:
+                gallery_item.update(self.image_fields(attachment, image))
+            pdf = pdfs.get(attachment['sha256']) if pdfs else None
+            if pdf:
+                gallery_item.update(self.pdf_fields(pdf))
+
             galleries[category].append(gallery_item)
 
         # Sort each gallery by name
@@ -279,32 +966,81 @@ class AttachmentDataGenerator:
                 if filename in references:
                     item['references'] = references[filename]['total_references']
 
-        # Save galleries as YAML (Jekyll's preferred format)
-        galleries_file = self.data_dir / "attachment_galleries.yml"
-        with open(galleries_file, 'w', encoding='utf-8') as f:
-            yaml.dump(galleries, f, default_flow_style=False, allow_unicode=True, sort_keys=False)
-        print(f"📊 Gallery data saved: {galleries_file}")
-
-        # Save references as YAML
-        references_file = self.data_dir / "attachment_references.yml"
-        with open(references_file, 'w', encoding='utf-8') as f:
-            yaml.dump(references, f, default_flow_style=False, allow_unicode=True, sort_keys=False)
-        print(f"🔗 Reference data saved: {references_file}")
-
-        # Also export JSON so GitHub Pages can fetch when inline data isn't injected
-        public_dir = self.site_root / "attachments-data"
-        public_dir.mkdir(exist_ok=True)
-
-        galleries_json = public_dir / "attachment_galleries.json"
-        references_json = public_dir / "attachment_references.json"
-
-        with open(galleries_json, 'w', encoding='utf-8') as f:
-            json.dump(galleries, f, ensure_ascii=False)
-        with open(references_json, 'w', encoding='utf-8') as f:
-            json.dump(references, f, ensure_ascii=False)
-
-        print(f"📁 Public JSON saved: {galleries_json}")
-        print(f"📁 Public JSON saved: {references_json}")
+        # Galleries and references as YAML (Jekyll's preferred format), and
+        # as JSON so GitHub Pages can fetch them when inline data isn't injected
+        public_dir = self.site_root / PUBLIC_DATA_DIR
+        index, shards = self.build_shards(references)
+        outputs = [
+            ("📊 Gallery data", self.data_dir / "attachment_galleries.yml", self.dump_yaml(galleries)),
+            ("🔗 Reference data", self.data_dir / "attachment_references.yml", self.dump_yaml(references)),
+            ("📁 Public JSON", public_dir / "attachment_galleries.json", json.dumps(galleries, ensure_ascii=False)),
+            ("📁 Public JSON", public_dir / "attachment_references.json", json.dumps(references, ensure_ascii=False)),
+            ("📁 Public JSON", public_dir / "index.json", json.dumps(index, ensure_ascii=False)),
+        ]
+
+        # Shards first, so the index never names one that is not there yet
+        written = sum(write_if_changed(public_dir / name, text) for name, text in shards.items())
+        removed = self.prune_shards(public_dir, shards)
+        print(f"🧩 Shards: {len(index['references']['shards'])} reference "
+              f"({written} written, {len(shards) - written} unchanged, {removed} removed)")
+
+        unchanged = []
+        for label, path, text in outputs:
+            if write_if_changed(path, text):
+                print(f"{label} saved: {path}")
+            else:
+                unchanged.append(path.name)
+        print(f"💾 {len(outputs) - len(unchanged)} written, {len(unchanged)} unchanged"
+              + (f" (skipped: {', '.join(unchanged)})" if unchanged else ""))
+
+    def build_shards(self, references):
+        """
+        Split the public references JSON into shards the browser can fetch
+        one at a time.
+
+        Returns the index and {shard path relative to PUBLIC_DATA_DIR: JSON
+        text}. References are spread over a power-of-two number of shards
+        by reference_bucket(filename). A shard's name ends in a hash of its
+        contents, so it can be cached for good; only the index is
+        revalidated. Galleries are not sharded: Jekyll injects them into
+        the Attachments tab.
+        """
+        shards = {}
+
+        def add_shard(directory, stem, data):
+            text = json.dumps(data, ensure_ascii=False)
+            name = f"{directory}/{stem}-{hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]}.json"
+            shards[name] = text
+            return name
+
+        buckets = 1
+        while buckets * REFERENCES_PER_SHARD < len(references):
+            buckets *= 2
+        grouped = [{} for _ in range(buckets)]
+        for filename, data in references.items():
+            grouped[reference_bucket(filename, buckets)][filename] = data
+        index = {'references': {
+            'count': len(references),
+            'bucket': 'fnv1a32',
+            'shards': [add_shard('references', f"{bucket:03d}", data) for bucket, data in enumerate(grouped)],
+        }}
+        return index, shards
+
+    def prune_shards(self, public_dir, keep):
+        """Delete shards from earlier runs that are not in `keep`; returns how many"""
+        removed = 0
+        for directory in SHARD_DIRS:
+            if not (public_dir / directory).is_dir():
+                continue
+            for entry in os.scandir(public_dir / directory):
+                if _SHARD_NAME.fullmatch(entry.name) and f"{directory}/{entry.name}" not in keep:
+                    os.unlink(entry.path)
+                    removed += 1
+        return removed
+
+    def dump_yaml(self, data):
+        """Serialise generated data for Jekyll's _data directory"""
+        return yaml.dump(data, Dumper=YamlDumper, default_flow_style=False, allow_unicode=True, sort_keys=False)
 
     def generate_stats(self, galleries, references):
         """Generate and display statistics"""
@@ -344,14 +1080,17 @@ class AttachmentDataGenerator:
             # Scan for references
             references = self.scan_content_for_references(attachments)
 
-            # Generate galleries
-            galleries = self.generate_galleries(attachments)
+            # Downscale images and read PDFs, then generate galleries
+            images = self.process_images(attachments)
+            pdfs = self.process_pdfs(attachments)
+            galleries = self.generate_galleries(attachments, images, pdfs)
 
             # Save data
             self.save_data(galleries, references)
 
             # Show stats
             self.generate_stats(galleries, references)
+            self.report_duplicates(attachments)
 
             print("✅ Attachment data generation completed successfully!")
 
@@ -360,8 +1099,13 @@ class AttachmentDataGenerator:
             raise
 
 if __name__ == "__main__":
-    import sys
-
-    site_root = sys.argv[1] if len(sys.argv) > 1 else "."
-    generator = AttachmentDataGenerator(site_root)
+    parser = argparse.ArgumentParser(description="Generate attachment gallery and reference data")
+    parser.add_argument("site_root", nargs="?", default=".", help="Jekyll site root (default: .)")
+    parser.add_argument("--no-index", action="store_true",
+                        help="Rescan every document and ignore .attachment-index/")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="Processes used to scan documents (default: CPU count; 1 scans serially)")
+    args = parser.parse_args()
+
+    generator = AttachmentDataGenerator(args.site_root, use_index=not args.no_index, jobs=args.jobs)
     generator.generate()
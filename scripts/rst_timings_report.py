@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Summarise RST render timings recorded with JEKYLL_RST_TIMINGS / --timings.
+
+Reads the JSON lines written by `_plugins/jekyll-rst/render_timings.py` and
+prints the slowest documents, the total and mean time per stage, Pygments
+highlight cache hit rates, bytes saved by HTML compaction and the documents
+that raised their process's peak memory the most. When a document was
+rendered more than once, only its latest record is used.
+
+Usage:
+  python3 scripts/rst_timings_report.py TIMINGS.jsonl [...] [--top N] [--json]
+"""
+
+import argparse
+import json
+import sys
+
+
+def load_records(paths: list) -> list:
+    latest = {}
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                latest[record.get('source_path') or '<stdin>'] = record
+    return list(latest.values())
+
+
+def summarise(records: list, top: int) -> dict:
+    stages = {}
+    for record in records:
+        for name, seconds in record.get('stages', {}).items():
+            stage = stages.setdefault(name, {'total': 0.0, 'max': 0.0, 'documents': 0})
+            stage['total'] += seconds
+            stage['max'] = max(stage['max'], seconds)
+            stage['documents'] += 1
+    for stage in stages.values():
+        stage['mean'] = stage['total'] / stage['documents']
+
+    highlight = {'calls': 0, 'cache_hits': 0, 'cache_misses': 0, 'seconds': 0.0}
+    for record in records:
+        for key in highlight:
+            highlight[key] += record.get('highlight', {}).get(key, 0)
+
+    slowest = sorted(records, key=lambda r: -r['seconds'])[:top]
+    growth = sorted((r for r in records if r.get('peak_rss_growth_kb')), key=lambda r: -r['peak_rss_growth_kb'])
+    saved = [r['bytes_saved'] for r in records if r.get('bytes_saved') is not None]
+    return {
+        'documents': len(records),
+        'cached': sum(1 for r in records if r.get('cached')),
+        'seconds': sum(r['seconds'] for r in records),
+        'slowest': [{'source_path': r.get('source_path'), 'seconds': r['seconds'], 'cached': r.get('cached')}
+                    for r in slowest],
+        'stages': dict(sorted(stages.items(), key=lambda item: -item[1]['total'])),
+        'highlight': highlight,
+        'bytes_saved': sum(saved) if saved else None,
+        'peak_rss_growth': [{'source_path': r.get('source_path'), 'kb': r['peak_rss_growth_kb']}
+                            for r in growth[:top]],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('timings', nargs='+', help='JSON lines file(s) written by --timings')
+    parser.add_argument('--top', type=int, default=10, help='Number of slowest documents to list')
+    parser.add_argument('--json', action='store_true', help='Print machine-readable results')
+    args = parser.parse_args()
+
+    try:
+        records = load_records(args.timings)
+    except OSError as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 1
+    if not records:
+        print('No timing records found', file=sys.stderr)
+        return 1
+
+    report = summarise(records, args.top)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+
+    print(f"{report['documents']} documents ({report['cached']} cached), {report['seconds']:.2f}s total")
+    print('\nSlowest documents:')
+    for doc in report['slowest']:
+        note = '  (cached)' if doc['cached'] else ''
+        print(f"  {doc['seconds'] * 1000:9.1f} ms  {doc['source_path']}{note}")
+
+    print('\nStages:                          total       mean        max')
+    for name, stage in report['stages'].items():
+        print(f"  {name:28} {stage['total'] * 1000:9.1f} ms {stage['mean'] * 1000:8.1f} ms "
+              f"{stage['max'] * 1000:8.1f} ms")
+
+    highlight = report['highlight']
+    if highlight['calls']:
+        hit_rate = highlight['cache_hits'] / highlight['calls'] * 100
+        print(f"\nPygments: {highlight['calls']} blocks, {hit_rate:.0f}% cache hits, "
+              f"{highlight['seconds'] * 1000:.1f} ms")
+    if report['bytes_saved'] is not None:
+        print(f"Compaction: {report['bytes_saved'] / 1024:.1f} KiB saved")
+    if report['peak_rss_growth']:
+        print('\nPeak memory growth:')
+        for doc in report['peak_rss_growth']:
+            print(f"  {doc['kb'] / 1024:9.1f} MiB  {doc['source_path']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())